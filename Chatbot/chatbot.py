@@ -1,16 +1,51 @@
-from langchain_cerebras import ChatCerebras
-from langchain_google_genai import ChatGoogleGenerativeAI   
-from dotenv import load_dotenv
+from typing import List, Optional
 
-load_dotenv()
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash-lite")
+from Core.metrics import instrument
+from Core.model_registry import model_registry, QWEN
+from Core.scheduler import llm_priority, priority, BULK, INTERACTIVE
+from Chatbot.sessions import ChatSession, SessionStore, Turn
 
+model = model_registry.chat_model("cerebras", QWEN, streaming=True)
+chat_model = instrument(model, "chat")
 
-model = ChatCerebras(model="qwen-3-235b-a22b-instruct-2507",streaming=True)
+summary_prompt = PromptTemplate(
+    template="""You keep a running summary of a conversation between a student and a tutor.
 
+Current summary:
+{summary}
 
-def Ai_stream(question:str):
-    for chunk in model.stream(question):
+Earlier turns to fold in:
+{turns}
+
+Write the updated summary in at most 150 words. Keep the student's goals, facts they shared about themselves, and what has already been explained. Return only the summary.""",
+    input_variables=["summary", "turns"],
+)
+summary_chain = instrument(
+    summary_prompt | model_registry.chat_model("cerebras", QWEN) | StrOutputParser(), "chat_summary"
+)
+
+
+async def summarize_turns(summary: str, turns: List[Turn]) -> str:
+    text = "\n".join(f"Student: {turn.question}\nTutor: {turn.answer}" for turn in turns)
+    with priority(BULK):
+        return await summary_chain.ainvoke({"summary": summary or "(none)", "turns": text})
+
+
+chat_sessions = SessionStore.from_env(summarize_turns)
+
+
+async def Ai_stream(question:str, session: Optional[ChatSession] = None):
+    # Set rather than scoped: the generator runs in the response's own task.
+    llm_priority.set(INTERACTIVE)
+    prompt = chat_sessions.messages(session, question) if session else question
+    answer = []
+    async for chunk in chat_model.astream(prompt):
         if(chunk.content):
+            answer.append(chunk.content)
             yield chunk.content
+    if session:
+        # Only completed answers become history; summarizing older turns happens in the background.
+        chat_sessions.record(session, question, "".join(answer))
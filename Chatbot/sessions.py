@@ -0,0 +1,181 @@
+import os
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+
+def estimate_tokens(text: str) -> int:
+    # Close enough for budgeting; avoids a tokenizer per provider.
+    return (len(text) + 3) // 4
+
+
+@dataclass
+class Turn:
+    question: str
+    answer: str
+    tokens: int
+
+    @property
+    def size(self) -> int:
+        return len(self.question.encode()) + len(self.answer.encode())
+
+
+@dataclass
+class ChatSession:
+    id: str
+    turns: List[Turn] = field(default_factory=list)
+    summary: str = ""
+    last_used: float = field(default_factory=time.monotonic)
+    summarizing: bool = False
+
+    @property
+    def size(self) -> int:
+        return sum(turn.size for turn in self.turns) + len(self.summary.encode())
+
+
+Summarizer = Callable[[str, List[Turn]], Awaitable[str]]
+
+
+class SessionStore:
+    """
+    Server-side chat history. Each turn sends the model the rolling summary
+    plus the most recent turns that fit in `history_budget` tokens; older
+    turns are folded into the summary by a background task, so input size
+    per turn stays flat however long the conversation gets. Sessions are
+    evicted least recently used beyond `max_sessions` and after `ttl` idle
+    seconds.
+    """
+
+    def __init__(
+        self,
+        summarize: Summarizer,
+        max_sessions: int = 10000,
+        ttl: float = 1800,
+        history_budget: int = 1500,
+        summary_chars: int = 1200,
+    ):
+        self.summarize = summarize
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.history_budget = history_budget
+        self.summary_chars = summary_chars
+        # Fold older turns in batches rather than paying a summary call every turn.
+        self.summary_batch_tokens = max(1, history_budget // 3)
+        # Turns kept per session if summarizing falls behind; the oldest are dropped beyond this.
+        self.max_session_tokens = history_budget * 4
+
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._tasks: set = set()
+        self.evictions = 0
+        self.summaries = 0
+        self.summary_failures = 0
+        self.dropped_turns = 0
+
+    def get_or_create(self, session_id: Optional[str]) -> ChatSession:
+        now = time.monotonic()
+        session = self._sessions.get(session_id) if session_id else None
+        if session is not None and now - session.last_used > self.ttl:
+            del self._sessions[session.id]
+            self.evictions += 1
+            session = None
+        if session is None:
+            # Unknown or expired ids get a fresh server-issued id.
+            session = ChatSession(id=uuid.uuid4().hex)
+            self._sessions[session.id] = session
+            self._evict(now)
+        session.last_used = now
+        self._sessions.move_to_end(session.id)
+        return session
+
+    def _evict(self, now: float) -> None:
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+        # Idle sessions sit at the front of the LRU order.
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used <= self.ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def _window(self, session: ChatSession) -> Tuple[List[Turn], List[Turn]]:
+        """Splits turns into (older turns to summarize, recent turns within the budget)."""
+        used = 0
+        start = len(session.turns)
+        for turn in reversed(session.turns):
+            if used + turn.tokens > self.history_budget:
+                break
+            used += turn.tokens
+            start -= 1
+        return session.turns[:start], session.turns[start:]
+
+    def messages(self, session: ChatSession, question: str) -> List[BaseMessage]:
+        _, recent = self._window(session)
+        messages: List[BaseMessage] = []
+        if session.summary:
+            messages.append(SystemMessage(content=f"Summary of the conversation so far:\n{session.summary}"))
+        for turn in recent:
+            messages.append(HumanMessage(content=turn.question))
+            messages.append(AIMessage(content=turn.answer))
+        messages.append(HumanMessage(content=question))
+        return messages
+
+    def record(self, session: ChatSession, question: str, answer: str) -> None:
+        session.turns.append(Turn(question, answer, estimate_tokens(question) + estimate_tokens(answer)))
+        session.last_used = time.monotonic()
+
+        stored = sum(turn.tokens for turn in session.turns)
+        while stored > self.max_session_tokens and len(session.turns) > 1:
+            stored -= session.turns.pop(0).tokens
+            self.dropped_turns += 1
+
+        older, _ = self._window(session)
+        if sum(turn.tokens for turn in older) >= self.summary_batch_tokens and not session.summarizing:
+            session.summarizing = True
+            task = asyncio.create_task(self._summarize(session, older))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _summarize(self, session: ChatSession, older: List[Turn]) -> None:
+        try:
+            summary = await self.summarize(session.summary, older)
+            session.summary = summary.strip()[: self.summary_chars]
+            # Only new turns were appended meanwhile (or old ones dropped), so remove what is left of `older`.
+            folded = {id(turn) for turn in older}
+            session.turns = [turn for turn in session.turns if id(turn) not in folded]
+            self.summaries += 1
+        except Exception as e:
+            self.summary_failures += 1
+            print(f"Chat summary failed for session {session.id}: {e}")
+        finally:
+            session.summarizing = False
+
+    def stats(self) -> dict:
+        sizes = [session.size for session in self._sessions.values()]
+        return {
+            "sessions": len(sizes),
+            "turns": sum(len(session.turns) for session in self._sessions.values()),
+            "bytes": sum(sizes),
+            "max_session_bytes": max(sizes, default=0),
+            "evictions": self.evictions,
+            "summaries": self.summaries,
+            "summary_failures": self.summary_failures,
+            "summaries_running": len(self._tasks),
+            "dropped_turns": self.dropped_turns,
+        }
+
+    @classmethod
+    def from_env(cls, summarize: Summarizer) -> "SessionStore":
+        return cls(
+            summarize,
+            max_sessions=int(os.getenv("CHAT_SESSION_MAX", "10000")),
+            ttl=float(os.getenv("CHAT_SESSION_TTL_SECONDS", "1800")),
+            history_budget=int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1500")),
+            summary_chars=int(os.getenv("CHAT_SUMMARY_MAX_CHARS", "1200")),
+        )
@@ -0,0 +1,151 @@
+import os
+import mmap
+import struct
+import hashlib
+import threading
+from typing import Optional
+
+# Entry layout: 16 byte header (magic, channels, sample width, frame rate) + raw PCM frames.
+HEADER = struct.Struct("<4sHHI4x")
+MAGIC = b"PCM1"
+
+
+class AudioChunkCache:
+    """
+    Content-addressed store of decoded PCM frames, one file per synthesized chunk.
+    Reads are memory-mapped so cached audio is served without copying;
+    the directory is kept under `max_bytes` by evicting least recently used files.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._total_bytes = sum(
+            entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith(".pcm")
+        )
+
+    @classmethod
+    def from_env(cls) -> Optional["AudioChunkCache"]:
+        directory = os.getenv("TTS_CACHE_DIR", ".cache/tts")
+        if not directory:
+            return None
+        return cls(directory, int(float(os.getenv("TTS_CACHE_MAX_MB", "512")) * 1024 * 1024))
+
+    @staticmethod
+    def key(text: str, language: str, model: str, speaker: str) -> str:
+        raw = "\x1f".join([" ".join(text.split()), language, model, speaker])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pcm")
+
+    def get(self, key: str):
+        """Returns ((channels, sample width, frame rate), memoryview of frames) or None. Blocking: call off the event loop."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            os.utime(path)
+        except FileNotFoundError:
+            self._count(hit=False)
+            return None
+        except ValueError:
+            # Empty file: mmap refuses to map it.
+            self._discard(path)
+            self._count(hit=False)
+            return None
+        except OSError:
+            self._count(hit=False)
+            return None
+
+        try:
+            magic, nchannels, sampwidth, framerate = HEADER.unpack_from(mapped)
+        except struct.error:
+            magic = None
+        if magic != MAGIC:
+            # Truncated or foreign file: drop it so the chunk is synthesized and stored again.
+            mapped.close()
+            self._discard(path)
+            self._count(hit=False)
+            return None
+
+        self._count(hit=True)
+        return (nchannels, sampwidth, framerate), memoryview(mapped)[HEADER.size:]
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _discard(self, path: str) -> None:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._total_bytes -= size
+
+    def put(self, key: str, audio_format: tuple, frames: bytes) -> None:
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, *audio_format))
+                f.write(frames)
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            # Atomic rename so other workers never map a half-written file.
+            os.replace(tmp_path, path)
+        except BaseException:
+            # Disk full or unwritable: leave no partial temp file behind.
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            # Rewriting a key replaces its file; only the difference is new.
+            self._total_bytes += HEADER.size + len(frames) - replaced
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".pcm")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                total -= size
+            except FileNotFoundError:
+                continue
+        self._total_bytes = total
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+audio_cache = AudioChunkCache.from_env()
@@ -0,0 +1,192 @@
+import os
+import re
+import time
+import sqlite3
+import bisect
+import threading
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from Core.metrics import registry
+
+# Lower bounds of the age bands; requests in the same band share content.
+AGE_BANDS = [int(age) for age in os.getenv("CONTENT_LIBRARY_AGE_BANDS", "8,11,14,17").split(",")]
+MIN_SCORE = float(os.getenv("CONTENT_LIBRARY_MIN_SCORE", "0.8"))
+# Share of the match score that comes from the topic name, which must match exactly;
+# the rest is the word overlap of the subjects.
+TOPIC_WEIGHT = 0.7
+# Fuzzy candidates scored per lookup.
+MAX_CANDIDATES = 100
+
+lookups_total = registry.counter("content_library_lookups_total", "Content library lookups by outcome: exact, fuzzy, miss", ["outcome"])
+lookup_seconds = registry.histogram(
+    "content_library_lookup_seconds", "Content library lookup time", buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+)
+
+# Words that do not change what a topic is about ("Basics of photosynthesis").
+STOPWORDS = {
+    "a", "an", "the", "of", "and", "or", "to", "in", "on", "for", "with", "about",
+    "into", "its", "is", "are", "how", "what", "intro", "introduction", "overview",
+}
+# Whitespace and ASCII/Devanagari punctuation; combining marks stay inside words.
+_SEPARATORS = re.compile(r"[\s!-/:-@\[-`{-~।॥]+")
+
+
+def terms(text: str) -> List[str]:
+    """Normalized, lightly stemmed, de-duplicated and sorted words of `text`."""
+    found = set()
+    for word in _SEPARATORS.split(text.casefold()):
+        if not word or word in STOPWORDS:
+            continue
+        if word.isascii() and len(word) > 4 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        found.add(word)
+    return sorted(found)
+
+
+def age_band(age: int) -> int:
+    return bisect.bisect_right(AGE_BANDS, age)
+
+
+def _scope(language: str, age: int) -> str:
+    # One FTS token, so filtering by language and age band happens inside the index.
+    return "".join(ch for ch in language.casefold() if ch.isalnum()) + f"b{age_band(age)}"
+
+
+def _dice(a: List[str], b: List[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return 2 * len(set(a) & set(b)) / (len(a) + len(b))
+
+
+def _scoped(scope: str, words: List[str]) -> str:
+    # Each word is indexed together with its scope, so a lookup only reads the
+    # (short) posting lists of its own language and age band.
+    return " ".join(f"{scope}_{word}" for word in words)
+
+
+def _query(scope: str, words: List[str]) -> str:
+    # Every topic word must be present; candidates are then filtered to no extra words.
+    return " AND ".join('"' + f"{scope}_{word}".replace('"', '""') + '"' for word in words)
+
+
+@dataclass
+class LibraryMatch:
+    content: str
+    score: float
+    exact: bool
+
+
+class ContentLibrary:
+    """
+    Generated topic expansions keyed by subject, topic name, language and
+    age band. Lookups first try the normalized key (word order, case, plurals
+    and filler words ignored), then an FTS5 search for stored topics with
+    exactly the same topic words (none missing, none added: "Parts of a
+    plant" never answers "Parts of a plant cell") under a differently worded
+    subject; those are scored by subject word overlap and served at or above
+    `min_score`.
+    """
+
+    def __init__(self, path: str, min_score: float = MIN_SCORE):
+        self.path = path
+        self.min_score = min_score
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS topics ("
+            "id INTEGER PRIMARY KEY, scope TEXT NOT NULL, key TEXT NOT NULL, "
+            "subject TEXT NOT NULL, topic TEXT NOT NULL, content TEXT NOT NULL, "
+            "created_at REAL NOT NULL, UNIQUE (scope, key))"
+        )
+        self._db.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS topics_fts USING fts5("
+            "scoped_terms, subject_terms UNINDEXED, topic_terms UNINDEXED, "
+            "tokenize=\"unicode61 categories 'L* N* Co M*' tokenchars '_'\")"
+        )
+        # Topics arrive one commit at a time; merge index segments eagerly so lookups read few of them.
+        self._db.execute("INSERT INTO topics_fts (topics_fts, rank) VALUES ('automerge', 2)")
+        self._db.commit()
+        self.topics = self._db.execute("SELECT COUNT(*) FROM topics").fetchone()[0]
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.stored = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["ContentLibrary"]:
+        path = os.getenv("CONTENT_LIBRARY_PATH")
+        return cls(path) if path else None
+
+    @staticmethod
+    def _key(subject_terms: List[str], topic_terms: List[str]) -> str:
+        return " ".join(subject_terms) + "|" + " ".join(topic_terms)
+
+    def lookup(self, subject: str, topic: str, language: str, age: int) -> Optional[LibraryMatch]:
+        started = time.perf_counter()
+        subject_terms, topic_terms = terms(subject), terms(topic)
+        scope = _scope(language, age)
+        match = None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT content FROM topics WHERE scope = ? AND key = ?", (scope, self._key(subject_terms, topic_terms))
+            ).fetchone()
+            if row is not None:
+                match = LibraryMatch(row[0], 1.0, True)
+            elif topic_terms:
+                # Scoped posting lists are short: score the candidates here rather than ask FTS for bm25.
+                candidates = self._db.execute(
+                    "SELECT rowid, subject_terms FROM topics_fts WHERE topics_fts MATCH ? AND topic_terms = ? LIMIT ?",
+                    (_query(scope, topic_terms), " ".join(topic_terms), MAX_CANDIDATES),
+                ).fetchall()
+                best: Tuple[float, int] = (0.0, 0)
+                for rowid, stored_subject in candidates:
+                    score = TOPIC_WEIGHT + (1 - TOPIC_WEIGHT) * _dice(subject_terms, stored_subject.split())
+                    best = max(best, (score, rowid))
+                if best[0] >= self.min_score:
+                    content = self._db.execute("SELECT content FROM topics WHERE id = ?", (best[1],)).fetchone()[0]
+                    match = LibraryMatch(content, best[0], False)
+
+        outcome = "miss" if match is None else "exact" if match.exact else "fuzzy"
+        if match is None:
+            self.misses += 1
+        elif match.exact:
+            self.exact_hits += 1
+        else:
+            self.fuzzy_hits += 1
+        lookups_total.inc(outcome)
+        lookup_seconds.observe(time.perf_counter() - started)
+        return match
+
+    def store(self, subject: str, topic: str, language: str, age: int, content: str) -> None:
+        subject_terms, topic_terms = terms(subject), terms(topic)
+        scope = _scope(language, age)
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO topics (scope, key, subject, topic, content, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (scope, self._key(subject_terms, topic_terms), subject, topic, content, time.time()),
+            )
+            if cursor.rowcount:
+                self._db.execute(
+                    "INSERT INTO topics_fts (rowid, scoped_terms, subject_terms, topic_terms) VALUES (?, ?, ?, ?)",
+                    (cursor.lastrowid, _scoped(scope, topic_terms), " ".join(subject_terms), " ".join(topic_terms)),
+                )
+                self.stored += 1
+                self.topics += 1
+            self._db.commit()
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.fuzzy_hits + self.misses
+        return {
+            "topics": self.topics,
+            "stored": self.stored,
+            "exact_hits": self.exact_hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.fuzzy_hits) / lookups if lookups else 0.0,
+        }
+
+
+content_library = ContentLibrary.from_env()
@@ -0,0 +1,258 @@
+import os
+import time
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from Core.metrics import registry
+from Core.scheduler import SchedulerOverloaded
+
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "1") == "1"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY_MS", "250")) / 1000
+HEDGE_MAX_DELAY = float(os.getenv("HEDGE_MAX_DELAY_MS", "3000")) / 1000
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY_MS", "1500")) / 1000
+# Below this many observed first tokens the percentile is too noisy to use.
+HEDGE_MIN_SAMPLES = 20
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+hedges_total = registry.counter("llm_hedges_total", "Hedge requests sent to a secondary provider", ["chain"])
+failovers_total = registry.counter("llm_failovers_total", "Requests retried on another provider after a failure", ["chain"])
+route_wins_total = registry.counter("llm_route_wins_total", "Which provider's answer was used", ["chain", "provider"])
+
+
+# ==========================================
+# 1. CIRCUIT BREAKER
+# ==========================================
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures. Once `reset_after`
+    seconds have passed a single probe request is let through; its outcome
+    closes the breaker again or restarts the wait.
+    """
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_after: float = CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.probing else "open"
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        return not self.probing and time.monotonic() - self.opened_at >= self.reset_after
+
+    def begin(self) -> None:
+        if self.opened_at is not None:
+            self.probing = True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+            self.trips += 1
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+    def record_abandoned(self) -> None:
+        # A cancelled probe (the other provider won) tells us nothing; let the next request probe.
+        self.probing = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def breaker(provider: str) -> CircuitBreaker:
+    found = _breakers.get(provider)
+    if found is None:
+        found = _breakers[provider] = CircuitBreaker()
+    return found
+
+
+def breaker_stats() -> dict:
+    states = {"closed": 0, "half_open": 1, "open": 2}
+    stats = {}
+    for provider, b in _breakers.items():
+        stats[f"{provider}_state"] = states[b.state]
+        stats[f"{provider}_trips"] = b.trips
+    return stats
+
+
+# ==========================================
+# 2. FIRST-TOKEN LATENCY
+# ==========================================
+
+class LatencyWindow:
+    """Recent time-to-first-token samples of one provider for one chain."""
+
+    def __init__(self, size: int = 200):
+        self.samples: deque = deque(maxlen=size)
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+class _FirstTokenWatcher(BaseCallbackHandler):
+    run_inline = True
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.ttft: Optional[float] = None
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started
+
+
+# ==========================================
+# 3. HEDGED RUNNABLE
+# ==========================================
+
+@dataclass(eq=False)
+class Route:
+    provider: str
+    chain: Runnable
+    latency: LatencyWindow = field(default_factory=LatencyWindow)
+
+
+class HedgedRunnable(Runnable):
+    """
+    Runs an idempotent chain on the first healthy provider. If it has not
+    produced a first token within the hedge delay (a percentile of its
+    recent first-token latencies), the next provider is started as well;
+    the first valid result wins and the other call is cancelled. Failed
+    calls fall over to the next provider.
+
+    Routes should use streaming models: first tokens are only observed
+    when the model streams.
+    """
+
+    def __init__(self, name: str, routes: List[Tuple[str, Runnable]], validate: Optional[Callable[[Any], bool]] = None):
+        self.name = name
+        self.routes = [Route(provider, chain) for provider, chain in routes]
+        self.validate = validate
+
+    def _ordered_routes(self) -> List[Route]:
+        healthy = [r for r in self.routes if breaker(r.provider).allow()]
+        # Every breaker open: try them all anyway rather than failing outright.
+        return healthy or list(self.routes)
+
+    def hedge_delay(self, route: Route) -> float:
+        delay = route.latency.percentile(HEDGE_PERCENTILE)
+        if delay is None:
+            return HEDGE_DEFAULT_DELAY
+        return min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, delay))
+
+    def _check(self, result: Any) -> Any:
+        if self.validate is not None and not self.validate(result):
+            raise ValueError(f"{self.name}: provider returned an invalid result")
+        return result
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        # Blocking callers get failover only; hedging needs the event loop.
+        error: Optional[Exception] = None
+        for route in self._ordered_routes():
+            breaker(route.provider).begin()
+            try:
+                result = self._check(route.chain.invoke(input, config, **kwargs))
+            except Exception as e:
+                breaker(route.provider).record_failure()
+                error = e
+                continue
+            breaker(route.provider).record_success()
+            route_wins_total.inc(self.name, route.provider)
+            return result
+        raise error
+
+    async def _attempt(self, route: Route, watcher: _FirstTokenWatcher, input: Any, config: Optional[RunnableConfig], **kwargs: Any) -> Any:
+        try:
+            result = self._check(await route.chain.with_config(callbacks=[watcher]).ainvoke(input, config, **kwargs))
+        except (asyncio.CancelledError, SchedulerOverloaded):
+            # Our own queue being full says nothing about the provider's health.
+            breaker(route.provider).record_abandoned()
+            raise
+        except Exception:
+            breaker(route.provider).record_failure()
+            raise
+        breaker(route.provider).record_success()
+        route.latency.observe(watcher.ttft if watcher.ttft is not None else time.perf_counter() - watcher.started)
+        return result
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        routes = self._ordered_routes()
+        pending: Dict[asyncio.Task, Route] = {}
+        watchers: Dict[Route, _FirstTokenWatcher] = {}
+        error: Optional[Exception] = None
+        next_route = 0
+
+        def launch() -> None:
+            nonlocal next_route
+            route = routes[next_route]
+            next_route += 1
+            breaker(route.provider).begin()
+            watcher = watchers[route] = _FirstTokenWatcher()
+            pending[asyncio.create_task(self._attempt(route, watcher, input, config, **kwargs))] = route
+
+        launch()
+        try:
+            while pending:
+                leader = routes[next_route - 1]
+                can_hedge = HEDGE_ENABLED and next_route < len(routes) and watchers[leader].ttft is None
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=self.hedge_delay(leader) if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    # Timed out; only hedge if the leader is still silent.
+                    if watchers[leader].ttft is None:
+                        hedges_total.inc(self.name)
+                        launch()
+                    continue
+
+                for task in done:
+                    route = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        error = e
+                        continue
+                    route_wins_total.inc(self.name, route.provider)
+                    return result
+
+                if not pending and next_route < len(routes):
+                    failovers_total.inc(self.name)
+                    launch()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+def hedged(name: str, routes: List[Tuple[str, Runnable]], validate: Optional[Callable[[Any], bool]] = None) -> HedgedRunnable:
+    return HedgedRunnable(name, routes, validate)
@@ -0,0 +1,291 @@
+import re
+import json
+from typing import Any, Iterable, List, Optional, Tuple
+
+# Paths are tuples of object keys and array indexes, e.g. ("practice_questions", 2).
+# Patterns use "*" to match any array index, e.g. ("practice_questions", "*").
+Path = Tuple[Any, ...]
+
+_STRING_SPECIAL = re.compile(r'["\\]')
+_SCALAR_END = re.compile(r'[,\]}\s]')
+_WHITESPACE = " \t\r\n"
+
+
+class JsonStreamError(ValueError):
+    pass
+
+
+def _matches(path: Path, pattern: Path) -> bool:
+    if len(path) != len(pattern):
+        return False
+    return all(p == "*" and isinstance(k, int) or p == k for k, p in zip(path, pattern))
+
+
+class _Frame:
+    __slots__ = ("kind", "value", "path", "key", "expect")
+
+    def __init__(self, kind: str, path: Path):
+        self.kind = kind
+        self.value = {} if kind == "object" else []
+        self.path = path
+        self.key = None
+        self.expect = "first"
+
+
+class IncrementalJsonParser:
+    """
+    Push tokenizer for a single JSON document arriving in pieces.
+
+    Every character is looked at once, so a stream costs O(n) in total instead
+    of re-parsing the whole buffer per token. `feed()` returns events:
+      ("delta", path, text)  new characters of a string at a `stream_strings` path
+      ("item", path, value)  a value at an `emit_items` path has just closed
+    Text before the first '{' or '[' (markdown fences, chatter) is skipped, as is
+    anything after the document closes. With `lenient=True` trailing commas
+    before '}' or ']' are accepted (and counted in `repairs`).
+    """
+
+    def __init__(self, stream_strings: Iterable[Path] = (), emit_items: Iterable[Path] = (), lenient: bool = False):
+        self.stream_strings = [tuple(p) for p in stream_strings]
+        self.emit_items = [tuple(p) for p in emit_items]
+        self.lenient = lenient
+        self.repairs = 0
+
+        self.result: Any = None
+        self.done = False
+
+        self._stack: List[_Frame] = []
+        self._events: list = []
+
+        self._string: Optional[list] = None
+        self._string_is_key = False
+        self._string_path: Path = ()
+        self._string_streamed = False
+        self._delta: list = []
+        self._escape = ""
+        self._high_surrogate: Optional[int] = None
+
+        self._scalar: Optional[list] = None
+        self._scalar_path: Path = ()
+
+    # ---- public API ----
+
+    def feed(self, text: str) -> list:
+        i, n = 0, len(text)
+        while i < n and not self.done:
+            if self._string is not None:
+                i = self._consume_string(text, i)
+            elif self._scalar is not None:
+                i = self._consume_scalar(text, i)
+            else:
+                i = self._consume_structure(text, i)
+
+        self._flush_delta()
+        events, self._events = self._events, []
+        return events
+
+    def close(self) -> None:
+        """Raises if the stream ended before the document was complete."""
+        if not self.done:
+            raise JsonStreamError("JSON document ended before it was complete")
+
+    def snapshot(self) -> Any:
+        """
+        The document as parsed so far: completed values only, with still-open
+        objects and arrays closed where they stand. None before the document starts.
+        """
+        if self.done:
+            return self.result
+        value = None
+        for frame in reversed(self._stack):
+            container = dict(frame.value) if frame.kind == "object" else list(frame.value)
+            if value is not None:
+                if frame.kind == "object":
+                    container[frame.key] = value
+                else:
+                    container.append(value)
+            value = container
+        return value
+
+    # ---- structure ----
+
+    def _consume_structure(self, text: str, i: int) -> int:
+        ch = text[i]
+        if ch in _WHITESPACE:
+            return i + 1
+
+        if not self._stack:
+            if ch in "{[":
+                self._open(ch, ())
+            # Anything else before the document starts is ignored.
+            return i + 1
+
+        frame = self._stack[-1]
+        expect = frame.expect
+
+        if frame.kind == "object":
+            if expect in ("first", "key"):
+                if ch == '"':
+                    self._start_string(is_key=True, path=frame.path)
+                elif ch == "}" and expect == "first":
+                    self._close()
+                elif ch == "}" and self.lenient:
+                    self.repairs += 1
+                    self._close()
+                else:
+                    raise JsonStreamError(f"Expected object key, got {ch!r}")
+            elif expect == "colon":
+                if ch != ":":
+                    raise JsonStreamError(f"Expected ':', got {ch!r}")
+                frame.expect = "value"
+            elif expect == "value":
+                self._start_value(ch, frame.path + (frame.key,))
+            else:
+                if ch == ",":
+                    frame.expect = "key"
+                elif ch == "}":
+                    self._close()
+                else:
+                    raise JsonStreamError(f"Expected ',' or '}}', got {ch!r}")
+        else:
+            if expect in ("first", "value"):
+                if ch == "]" and expect == "first":
+                    self._close()
+                elif ch == "]" and self.lenient:
+                    self.repairs += 1
+                    self._close()
+                else:
+                    self._start_value(ch, frame.path + (len(frame.value),))
+            else:
+                if ch == ",":
+                    frame.expect = "value"
+                elif ch == "]":
+                    self._close()
+                else:
+                    raise JsonStreamError(f"Expected ',' or ']', got {ch!r}")
+        return i + 1
+
+    def _start_value(self, ch: str, path: Path) -> None:
+        if ch in "{[":
+            self._open(ch, path)
+        elif ch == '"':
+            self._start_string(is_key=False, path=path)
+        elif ch in "-0123456789tfn":
+            self._scalar = [ch]
+            self._scalar_path = path
+        else:
+            raise JsonStreamError(f"Unexpected character {ch!r}")
+
+    def _open(self, ch: str, path: Path) -> None:
+        self._stack.append(_Frame("object" if ch == "{" else "array", path))
+
+    def _close(self) -> None:
+        frame = self._stack.pop()
+        self._complete(frame.value, frame.path)
+
+    def _complete(self, value: Any, path: Path) -> None:
+        if any(_matches(path, pattern) for pattern in self.emit_items):
+            self._events.append(("item", path, value))
+
+        if not self._stack:
+            self.result = value
+            self.done = True
+            return
+
+        parent = self._stack[-1]
+        if parent.kind == "object":
+            parent.value[parent.key] = value
+        else:
+            parent.value.append(value)
+        parent.expect = "next"
+
+    # ---- scalars ----
+
+    def _consume_scalar(self, text: str, i: int) -> int:
+        match = _SCALAR_END.search(text, i)
+        if match is None:
+            self._scalar.append(text[i:])
+            return len(text)
+        self._scalar.append(text[i:match.start()])
+        self._finish_scalar()
+        return match.start()
+
+    def _finish_scalar(self) -> None:
+        literal = "".join(self._scalar)
+        self._scalar = None
+        try:
+            value = json.loads(literal)
+        except ValueError:
+            raise JsonStreamError(f"Invalid literal {literal!r}")
+        self._complete(value, self._scalar_path)
+
+    # ---- strings ----
+
+    def _start_string(self, is_key: bool, path: Path) -> None:
+        self._string = []
+        self._string_is_key = is_key
+        self._string_path = path
+        self._string_streamed = not is_key and any(_matches(path, p) for p in self.stream_strings)
+
+    def _append(self, piece: str) -> None:
+        self._string.append(piece)
+        if self._string_streamed:
+            self._delta.append(piece)
+
+    def _flush_delta(self) -> None:
+        if self._delta:
+            self._events.append(("delta", self._string_path, "".join(self._delta)))
+            self._delta = []
+
+    def _consume_string(self, text: str, i: int) -> int:
+        if self._escape:
+            return self._consume_escape(text, i)
+
+        match = _STRING_SPECIAL.search(text, i)
+        if match is None:
+            self._append(text[i:])
+            return len(text)
+
+        if match.start() > i:
+            self._append(text[i:match.start()])
+
+        if match.group() == "\\":
+            self._escape = "\\"
+            return match.start() + 1
+
+        self._finish_string()
+        return match.start() + 1
+
+    def _consume_escape(self, text: str, i: int) -> int:
+        self._escape += text[i]
+        escape = self._escape
+        if escape[1] == "u" and len(escape) < 6:
+            return i + 1
+        self._escape = ""
+
+        try:
+            decoded = json.loads(f'"{escape}"')
+        except ValueError:
+            raise JsonStreamError(f"Invalid escape {escape!r}")
+
+        code = ord(decoded)
+        if 0xD800 <= code <= 0xDBFF:
+            self._high_surrogate = code
+            return i + 1
+        if 0xDC00 <= code <= 0xDFFF and self._high_surrogate is not None:
+            decoded = chr(0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00))
+        self._high_surrogate = None
+        self._append(decoded)
+        return i + 1
+
+    def _finish_string(self) -> None:
+        self._flush_delta()
+        value = "".join(self._string)
+        self._string = None
+
+        if self._string_is_key:
+            frame = self._stack[-1]
+            frame.key = value
+            frame.expect = "colon"
+        else:
+            self._complete(value, self._string_path)
@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from pydantic import BaseModel
+
+from Core.metrics import registry, request_stages
+from Core.sse import HEARTBEAT, SSE_HEARTBEAT_SECONDS, format_event
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "100"))
+JOB_RESULT_TTL_SECONDS = float(os.getenv("JOB_RESULT_TTL_SECONDS", "3600"))
+JOB_MAX_RETAINED = int(os.getenv("JOB_MAX_RETAINED", "1000"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+job_wait_seconds = registry.histogram("job_queue_wait_seconds", "Time jobs spend queued before a worker picks them up", ["queue"])
+job_run_seconds = registry.histogram("job_run_seconds", "Job run time by outcome", ["queue", "status"])
+
+Progress = Callable[..., None]
+Work = Callable[[Progress], Awaitable[Any]]
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, key: str, work: Work):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.work = work
+        self.status = QUEUED
+        self.progress: Dict[str, Any] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # Replaced on every update; subscribers wait on the one they saw last.
+        self.changed = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def update(self, **fields: Any) -> None:
+        changed, self.changed = self.changed, asyncio.Event()
+        for name, value in fields.items():
+            setattr(self, name, value)
+        changed.set()
+
+    def report(self, **progress: Any) -> None:
+        self.update(progress={**self.progress, **progress})
+
+    def snapshot(self) -> dict:
+        result = self.result.model_dump() if isinstance(self.result, BaseModel) else self.result
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": self.progress,
+            "result": result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    Runs long generations outside the request: `submit` returns a job at
+    once and a fixed pool of workers runs queued jobs. Submitting the same
+    key again while its job is queued, running or finished (and not yet
+    expired) returns that job instead of doing the work twice; failed jobs
+    can be resubmitted. Finished jobs are kept for `ttl` seconds, and at
+    most `max_retained` of them.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        workers: int = JOB_WORKERS,
+        max_pending: int = JOB_MAX_PENDING,
+        ttl: float = JOB_RESULT_TTL_SECONDS,
+        max_retained: int = JOB_MAX_RETAINED,
+    ):
+        self.name = name
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.max_retained = max_retained
+
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._by_key: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: list = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    def _start(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or a new event loop (tests): workers belong to one loop.
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        return self._queue
+
+    def _expire(self) -> None:
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.done]
+        excess = len(finished) - self.max_retained
+        for job in finished:
+            if excess > 0 or now - job.finished_at > self.ttl:
+                excess -= 1
+                self._forget(job)
+
+    def _forget(self, job: Job) -> None:
+        self._jobs.pop(job.id, None)
+        if self._by_key.get(job.key) is job:
+            del self._by_key[job.key]
+
+    def submit(self, key: str, work: Work) -> Job:
+        """Queues `work(report)`; raises JobQueueFull when `max_pending` jobs are waiting."""
+        self._expire()
+        existing = self._by_key.get(key)
+        if existing is not None and existing.status != FAILED:
+            self.deduplicated += 1
+            return existing
+
+        queue = self._start()
+        job = Job(key, work)
+        try:
+            queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise JobQueueFull(f"{self.name} queue is full ({self.max_pending} jobs waiting)")
+        if existing is not None:
+            self._forget(existing)
+        self._jobs[job.id] = job
+        self._by_key[key] = job
+        self.submitted += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._expire()
+        return self._jobs.get(job_id)
+
+    async def _worker(self) -> None:
+        # Workers outlive the request that started them; don't log into its stage list.
+        request_stages.set(None)
+        while True:
+            job = await self._queue.get()
+            started = time.time()
+            job_wait_seconds.observe(started - job.created_at, self.name)
+            job.update(status=RUNNING, started_at=started)
+            try:
+                result = await job.work(job.report)
+                job.update(status=SUCCEEDED, result=result, finished_at=time.time())
+                self.succeeded += 1
+            except Exception as e:
+                print(f"{self.name} job {job.id} failed: {e}")
+                job.update(status=FAILED, error=str(e), finished_at=time.time())
+                self.failed += 1
+            finally:
+                # Only needed to run it; don't keep the payload alive with the result.
+                job.work = None
+                job_run_seconds.observe(time.time() - started, self.name, job.status)
+
+    async def events(self, job: Job, heartbeat: float = SSE_HEARTBEAT_SECONDS) -> AsyncIterator[str]:
+        """SSE frames with a snapshot of the job on every change, ending once it has finished."""
+        while True:
+            changed = job.changed
+            yield format_event(json.dumps(job.snapshot()), event=job.status)
+            if job.done:
+                return
+            while True:
+                try:
+                    await asyncio.wait_for(changed.wait(), heartbeat)
+                    break
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+
+    def stats(self) -> dict:
+        counts = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return {
+            "queued": counts[QUEUED],
+            "running": counts[RUNNING],
+            "retained_succeeded": counts[SUCCEEDED],
+            "retained_failed": counts[FAILED],
+            "workers": self.workers,
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "rejected": self.rejected,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+        }
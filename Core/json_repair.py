@@ -0,0 +1,112 @@
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple, Type, get_args, get_origin
+
+from pydantic import BaseModel, ValidationError
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import BaseOutputParser
+
+from Core.incremental_json import IncrementalJsonParser, JsonStreamError
+
+
+@dataclass
+class RepairedJson:
+    value: Any
+    complete: bool   # the document was closed (possibly after fixes)
+    repaired: bool   # plain json.loads was not enough
+
+
+def repair_json(text: str) -> RepairedJson:
+    """
+    Reads the JSON document out of a model answer, fixing what models get
+    wrong most often: markdown fences and chatter around the JSON, trailing
+    commas, and answers cut off mid-document (the completed part is kept).
+    """
+    try:
+        return RepairedJson(json.loads(text), True, False)
+    except ValueError:
+        pass
+
+    parser = IncrementalJsonParser(lenient=True)
+    try:
+        parser.feed(text)
+    except JsonStreamError:
+        # Keep whatever was well formed up to the error.
+        pass
+    if parser.done:
+        return RepairedJson(parser.result, True, True)
+
+    value = parser.snapshot()
+    if value is None:
+        raise OutputParserException("No JSON document in model output", llm_output=text)
+    return RepairedJson(value, False, True)
+
+
+def message_text(message: Any) -> str:
+    content = getattr(message, "content", message)
+    if isinstance(content, str):
+        return content
+    return "".join(part if isinstance(part, str) else part.get("text", "") for part in content)
+
+
+class JsonRepairParser(BaseOutputParser[RepairedJson]):
+    """Output parser step for `prompt | model | JsonRepairParser()`."""
+
+    def parse(self, text: str) -> RepairedJson:
+        return repair_json(text)
+
+    @property
+    def _type(self) -> str:
+        return "json_repair"
+
+
+# ==========================================
+# SALVAGE
+# ==========================================
+
+def _list_item_model(annotation: Any) -> Optional[Type[BaseModel]]:
+    if get_origin(annotation) is not list:
+        # Optional[List[X]]
+        for arg in get_args(annotation):
+            found = _list_item_model(arg)
+            if found is not None:
+                return found
+        return None
+    args = get_args(annotation)
+    if args and isinstance(args[0], type) and issubclass(args[0], BaseModel):
+        return args[0]
+    return None
+
+
+def _is_valid(model: Type[BaseModel], item: Any) -> bool:
+    try:
+        model.model_validate(item)
+        return True
+    except ValidationError:
+        return False
+
+
+def salvage(output_model: Type[BaseModel], value: Any, defaults: Optional[Dict[str, Any]] = None) -> Tuple[Optional[BaseModel], bool]:
+    """
+    Validates `value` as `output_model`, filling missing top-level fields from
+    `defaults` and dropping list items (e.g. a half-written Question) that do
+    not validate. Returns (model or None, whether anything had to be changed).
+    """
+    if not isinstance(value, dict):
+        return None, True
+    data = {**(defaults or {}), **value}
+    changed = len(data) != len(value)
+    try:
+        return output_model.model_validate(data), changed
+    except ValidationError:
+        pass
+
+    for name, field in output_model.model_fields.items():
+        item_model = _list_item_model(field.annotation)
+        items = data.get(name)
+        if item_model is not None and isinstance(items, list):
+            data[name] = [item for item in items if _is_valid(item_model, item)]
+    try:
+        return output_model.model_validate(data), True
+    except ValidationError:
+        return None, True
@@ -0,0 +1,307 @@
+import os
+import json
+import fnmatch
+import time
+import logging
+import threading
+import contextvars
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+timing_log = logging.getLogger("lowsignal.timing")
+if os.getenv("TIMING_LOG", "0") == "1":
+    if not timing_log.handlers:
+        # One JSON line per request on stderr, independent of uvicorn's logging config.
+        timing_log.addHandler(logging.StreamHandler())
+        timing_log.setLevel(logging.INFO)
+        timing_log.propagate = False
+else:
+    # Off even under a root logger at INFO, so the middleware skips building the line.
+    timing_log.setLevel(logging.WARNING)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Stage timings of the request currently being served, for the per-request log.
+request_stages: contextvars.ContextVar[Optional[List[dict]]] = contextvars.ContextVar("request_stages", default=None)
+
+
+# ==========================================
+# 1. METRIC TYPES (Prometheus text format)
+# ==========================================
+
+def _escape(value) -> str:
+    # Exposition format: backslash, double quote and newline must be escaped inside label values.
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in self._values.items():
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in self._values.items():
+                for bound, count in zip(self.buckets, series):
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {count}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {series[-2]}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+        self._gauges: List[Tuple[str, str, Callable[[], Dict[str, float]]]] = []
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauges(
+        self, prefix: str, help_text: str, collect: Callable[[], Dict[str, float]], counters: Sequence[str] = ()
+    ) -> None:
+        """
+        Registers values computed at scrape time, e.g. cache counters kept elsewhere.
+        Fields matching a name (or glob, e.g. "*_trips" for per-provider fields)
+        in `counters` only ever increase: they are exported as
+        `<prefix>_<field>_total` counters so rate() works on them.
+        """
+        self._gauges.append((prefix, help_text, collect, tuple(counters)))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for prefix, help_text, collect, counters in self._gauges:
+            for field, value in collect().items():
+                if any(fnmatch.fnmatchcase(field, c) for c in counters):
+                    name, kind = f"{prefix}_{field}_total", "counter"
+                else:
+                    name, kind = f"{prefix}_{field}", "gauge"
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds", "Request latency by route, until the last body byte", ["route", "method", "status"]
+)
+http_ttfb_seconds = registry.histogram(
+    "http_time_to_first_byte_seconds", "Time until the first body byte by route", ["route"]
+)
+sse_events_total = registry.counter("sse_events_total", "Server-sent events written", ["route"])
+chain_stage_seconds = registry.histogram(
+    "chain_stage_seconds", "Time per chain stage (prompt, llm, parse; cache/sarvam for tts)", ["chain", "stage"]
+)
+llm_ttft_seconds = registry.histogram("llm_time_to_first_token_seconds", "Provider time to first token", ["chain"])
+llm_tokens_total = registry.counter("llm_tokens_total", "Tokens reported by the provider", ["chain", "direction"])
+chain_failures_total = registry.counter("chain_failures_total", "Failed chain stages", ["chain", "stage"])
+
+
+def record_stage(chain: str, stage: str, seconds: float) -> None:
+    chain_stage_seconds.observe(seconds, chain, stage)
+    stages = request_stages.get()
+    if stages is not None:
+        stages.append({"chain": chain, "stage": stage, "ms": round(seconds * 1000, 2)})
+
+
+# ==========================================
+# 2. CHAIN INSTRUMENTATION
+# ==========================================
+
+class ChainMetricsHandler(BaseCallbackHandler):
+    """
+    Callback handler attached to a chain with `.with_config(callbacks=[...])`.
+    Times the prompt, model and parser steps, the model's first token,
+    and counts tokens and parse failures under the chain's name.
+    """
+
+    run_inline = True
+
+    def __init__(self, chain: str):
+        self.chain = chain
+        self._started: Dict[UUID, Tuple[str, float]] = {}
+        self._first_token: set = set()
+
+    def _start(self, run_id: UUID, stage: str) -> None:
+        self._started[run_id] = (stage, time.perf_counter())
+
+    def _finish(self, run_id: UUID) -> Optional[str]:
+        started = self._started.pop(run_id, None)
+        self._first_token.discard(run_id)
+        if started is None:
+            return None
+        stage, at = started
+        record_stage(self.chain, stage, time.perf_counter() - at)
+        return stage
+
+    def on_chain_start(self, serialized: Any, inputs: Any, *, run_id: UUID, run_type: Optional[str] = None, **kwargs: Any) -> None:
+        if run_type == "prompt":
+            self._start(run_id, "prompt")
+        elif run_type == "parser":
+            self._start(run_id, "parse")
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        stage = self._finish(run_id)
+        if stage is not None:
+            chain_failures_total.inc(self.chain, stage)
+
+    def on_chat_model_start(self, serialized: Any, messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, "llm")
+
+    def on_llm_start(self, serialized: Any, prompts: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, "llm")
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        if run_id in self._first_token:
+            return
+        started = self._started.get(run_id)
+        if started is not None:
+            self._first_token.add(run_id)
+            seconds = time.perf_counter() - started[1]
+            llm_ttft_seconds.observe(seconds, self.chain)
+            stages = request_stages.get()
+            if stages is not None:
+                stages.append({"chain": self.chain, "stage": "ttft", "ms": round(seconds * 1000, 2)})
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    llm_tokens_total.inc(self.chain, "input", amount=usage.get("input_tokens", 0))
+                    llm_tokens_total.inc(self.chain, "output", amount=usage.get("output_tokens", 0))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+        chain_failures_total.inc(self.chain, "llm")
+
+
+def instrument(chain, name: str):
+    return chain.with_config(callbacks=[ChainMetricsHandler(name)], run_name=name)
+
+
+# ==========================================
+# 3. ASGI MIDDLEWARE
+# ==========================================
+
+class MetricsMiddleware:
+    """
+    Records latency, time to first byte and SSE event counts per route,
+    and writes one structured timing log line per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        stages: List[dict] = []
+        token = request_stages.set(stages)
+        state = {"status": 500, "sse": False, "events": 0, "first_byte": None}
+
+        async def instrumented_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                headers = dict(message.get("headers", []))
+                state["sse"] = headers.get(b"content-type", b"").startswith(b"text/event-stream")
+            elif message["type"] == "http.response.body":
+                body = message.get("body", b"")
+                if body and state["first_byte"] is None:
+                    state["first_byte"] = time.perf_counter() - started
+                if state["sse"]:
+                    state["events"] += body.count(b"\n\n")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, instrumented_send)
+        finally:
+            request_stages.reset(token)
+            elapsed = time.perf_counter() - started
+            # Unmatched requests (404s, scanners) share one label so raw paths cannot grow the series.
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+
+            http_request_seconds.observe(elapsed, route, method, str(state["status"]))
+            if state["first_byte"] is not None:
+                http_ttfb_seconds.observe(state["first_byte"], route)
+            if state["events"]:
+                sse_events_total.inc(route, amount=state["events"])
+
+            if timing_log.isEnabledFor(logging.INFO):
+                timing_log.info(json.dumps({
+                    "route": route,
+                    "method": method,
+                    "status": state["status"],
+                    "ms": round(elapsed * 1000, 2),
+                    "ttfb_ms": round(state["first_byte"] * 1000, 2) if state["first_byte"] is not None else None,
+                    "sse_events": state["events"],
+                    "stages": stages,
+                }))
@@ -0,0 +1,234 @@
+import os
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from Core.scheduler import scheduler
+
+load_dotenv()
+
+QWEN = "qwen-3-235b-a22b-instruct-2507"
+GEMINI_FLASH_LITE = "gemini-2.5-flash-lite"
+
+MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20"))
+# One TTS chunk takes seconds, not minutes: fail it well before OpenAI's 600 s default read timeout.
+SARVAM_TIMEOUT = float(os.getenv("SARVAM_HTTP_TIMEOUT_SECONDS", "60"))
+
+ModelKey = Tuple[str, str, bool]
+# (registry, model, streaming) -> client
+ModelFactory = Callable[["ModelRegistry", str, bool], Any]
+
+
+# ==========================================
+# 1. PROVIDER FACTORIES
+# ==========================================
+# Provider SDKs are imported here, on first use, rather than when a service
+# module is imported: most workers only ever touch one or two of them.
+
+def _cerebras(registry: "ModelRegistry", model: str, streaming: bool) -> Any:
+    from langchain_cerebras import ChatCerebras
+
+    return ChatCerebras(
+        model=model,
+        streaming=streaming,
+        http_client=registry.http_client(),
+        http_async_client=registry.http_async_client(),
+    )
+
+
+def _google(registry: "ModelRegistry", model: str, streaming: bool) -> Any:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(model=model, streaming=streaming)
+
+
+def _sarvam(registry: "ModelRegistry", model: str, streaming: bool) -> Any:
+    from sarvamai import AsyncSarvamAI
+
+    return AsyncSarvamAI(
+        api_subscription_key=os.getenv("SARVAM_API_KEY"),
+        httpx_client=registry.sarvam_http_client(),
+    )
+
+
+# ==========================================
+# 2. REGISTRY
+# ==========================================
+
+class ModelRegistry:
+    """
+    Builds one client per (provider, model, streaming) on first use and
+    shares keep-alive HTTP connection pools between all of them.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, ModelFactory] = {
+            "cerebras": _cerebras,
+            "google": _google,
+            "sarvam": _sarvam,
+        }
+        self._models: Dict[ModelKey, Any] = {}
+        self._http: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def register(self, provider: str, factory: ModelFactory) -> None:
+        """Replaces how a provider's clients are built, e.g. with local fakes."""
+        with self._lock:
+            self._factories[provider] = factory
+            for key in [k for k in self._models if k[0] == provider]:
+                del self._models[key]
+
+    def get(self, provider: str, model: str = "", streaming: bool = False) -> Any:
+        key = (provider, model, streaming)
+        client = self._models.get(key)
+        if client is None:
+            with self._lock:
+                client = self._models.get(key)
+                if client is None:
+                    client = self._models[key] = self._factories[provider](self, model, streaming)
+        return client
+
+    def chat_model(self, provider: str, model: str, streaming: bool = False) -> "LazyChatModel":
+        return LazyChatModel(self, provider, model, streaming)
+
+    def _pool(self, kind: str) -> Any:
+        client = self._http.get(kind)
+        if client is None:
+            with self._lock:
+                client = self._http.get(kind)
+                if client is None:
+                    import httpx
+                    import openai
+
+                    limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE)
+                    if kind == "sarvam":
+                        # Plain httpx: the SDK reads its per-request timeout from this client.
+                        client = httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(SARVAM_TIMEOUT, connect=10.0))
+                    else:
+                        cls = openai.DefaultAsyncHttpxClient if kind == "async" else openai.DefaultHttpxClient
+                        client = cls(limits=limits)
+                    self._http[kind] = client
+        return client
+
+    def http_client(self) -> Any:
+        return self._pool("sync")
+
+    def http_async_client(self) -> Any:
+        return self._pool("async")
+
+    def sarvam_http_client(self) -> Any:
+        return self._pool("sarvam")
+
+    def stats(self) -> dict:
+        return {"clients": len(self._models), "http_pools": len(self._http)}
+
+
+# ==========================================
+# 3. LAZY RUNNABLES
+# ==========================================
+
+class LazyRunnable(Runnable[LanguageModelInput, Any]):
+    """
+    Delegates every call to the runnable returned by `resolve()`. Async
+    calls first take a slot from the scheduler for `provider`.
+    """
+
+    name = None
+    provider = ""
+
+    def resolve(self) -> Runnable:
+        raise NotImplementedError
+
+    def invoke(self, input: LanguageModelInput, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return self.resolve().invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input: LanguageModelInput, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        async with scheduler.slot(self.provider, input) as ticket:
+            output = await self.resolve().ainvoke(input, config, **kwargs)
+            if ticket:
+                ticket.observe(output)
+            return output
+
+    def batch(self, inputs: List[LanguageModelInput], config: Any = None, **kwargs: Any) -> List[Any]:
+        return self.resolve().batch(inputs, config, **kwargs)
+
+    # abatch: Runnable's default runs `ainvoke` per input, so each one is scheduled.
+
+    def stream(self, input: LanguageModelInput, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator[Any]:
+        return self.resolve().stream(input, config, **kwargs)
+
+    async def astream(self, input: LanguageModelInput, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[Any]:
+        # The slot is held until the stream ends or is closed.
+        async with scheduler.slot(self.provider, input) as ticket:
+            async for chunk in self.resolve().astream(input, config, **kwargs):
+                if ticket:
+                    ticket.observe(chunk)
+                yield chunk
+
+    def transform(self, input: Iterator[LanguageModelInput], config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator[Any]:
+        return self.resolve().transform(input, config, **kwargs)
+
+    async def atransform(self, input: AsyncIterator[LanguageModelInput], config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[Any]:
+        # `prompt | model` streams through here; models need the whole prompt before starting anyway.
+        final = None
+        async for chunk in input:
+            final = chunk if final is None else final + chunk
+        async for output in self.astream(final, config, **kwargs):
+            yield output
+
+
+class LazyChatModel(LazyRunnable):
+    """
+    Placeholder that can be composed into chains at import time; the real
+    chat model is fetched from the registry the first time it is called.
+    """
+
+    def __init__(self, registry: ModelRegistry, provider: str, model: str, streaming: bool = False):
+        self.registry = registry
+        self.provider = provider
+        self.model_name = model
+        self.streaming = streaming
+
+    @property
+    def model(self) -> Any:
+        return self.registry.get(self.provider, self.model_name, self.streaming)
+
+    def resolve(self) -> Runnable:
+        return self.model
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> "LazyStructuredOutput":
+        return LazyStructuredOutput(self, schema, kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        # Other provider-specific helpers (bind_tools, get_num_tokens, ...).
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def __repr__(self) -> str:
+        return f"LazyChatModel({self.provider}:{self.model_name}, streaming={self.streaming})"
+
+
+class LazyStructuredOutput(LazyRunnable):
+    """`model.with_structured_output(schema)`, built when the model is."""
+
+    def __init__(self, chat_model: LazyChatModel, schema: Any, kwargs: dict):
+        self.chat_model = chat_model
+        self.provider = chat_model.provider
+        self.schema = schema
+        self.kwargs = kwargs
+        self._built: Optional[Tuple[Any, Runnable]] = None
+
+    def resolve(self) -> Runnable:
+        model = self.chat_model.model
+        # Rebuilt if the registry swapped the provider's factory since.
+        if self._built is None or self._built[0] is not model:
+            self._built = (model, model.with_structured_output(self.schema, **self.kwargs))
+        return self._built[1]
+
+
+model_registry = ModelRegistry()
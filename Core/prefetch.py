@@ -0,0 +1,102 @@
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from Core.metrics import request_stages
+from Core.scheduler import SharedPriority, current_priority, llm_priority, shared_priority, BULK
+
+
+class Prefetcher:
+    """
+    Speculative results computed in the background at bulk priority and
+    handed out once to the request that asks for them. A request arriving
+    while its prefetch is still running waits for it rather than starting
+    the same generation again, and raises the prefetch to its own priority
+    so it does not wait behind bulk work. Results nobody asked for within `ttl`
+    seconds, or pushed out beyond `max_entries`, count as wasted.
+    """
+
+    def __init__(self, ttl: float = 1800, max_entries: int = 500):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._ready: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (stored_at, value)
+        self._pending: Dict[str, Tuple[asyncio.Task, SharedPriority]] = {}
+        # Pending keys a request is already waiting on; their result is not kept.
+        self._claimed: set = set()
+        self.started = 0
+        self.failed = 0
+        self.hits = 0
+        self.hits_in_flight = 0
+        self.misses = 0
+        self.wasted = 0
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        while self._ready:
+            stored_at, _ = next(iter(self._ready.values()))
+            if len(self._ready) <= self.max_entries and now - stored_at <= self.ttl:
+                break
+            self._ready.popitem(last=False)
+            self.wasted += 1
+
+    def schedule(self, key: str, fn: Callable[[], Awaitable[Any]]) -> None:
+        self._expire()
+        if key in self._ready or key in self._pending:
+            return
+        self.started += 1
+        urgency = SharedPriority(BULK)
+        task = asyncio.create_task(self._run(key, fn, urgency))
+        self._pending[key] = (task, urgency)
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]], urgency: SharedPriority) -> Any:
+        # Own context copy: not part of the request that scheduled it, and low priority until a request waits on it.
+        request_stages.set(None)
+        llm_priority.set(BULK)
+        shared_priority.set(urgency)
+        try:
+            value = await fn()
+        except Exception as e:
+            self.failed += 1
+            print(f"Prefetch failed for {key[:12]}: {e}")
+            return None
+        finally:
+            self._pending.pop(key, None)
+            claimed = key in self._claimed
+            self._claimed.discard(key)
+        if not claimed:
+            self._ready[key] = (time.monotonic(), value)
+            self._expire()
+        return value
+
+    async def take(self, key: str) -> Optional[Any]:
+        """The prefetched result for `key` (waiting for it if still running), or None."""
+        self._expire()
+        ready = self._ready.pop(key, None)
+        if ready is not None:
+            self.hits += 1
+            return ready[1]
+        pending = self._pending.get(key)
+        if pending is not None:
+            task, urgency = pending
+            self.hits_in_flight += 1
+            self._claimed.add(key)
+            urgency.raise_to(current_priority())
+            return await asyncio.shield(task)
+        self.misses += 1
+        return None
+
+    def stats(self) -> dict:
+        self._expire()
+        requests = self.hits + self.hits_in_flight + self.misses
+        return {
+            "started": self.started,
+            "pending": len(self._pending),
+            "ready": len(self._ready),
+            "failed": self.failed,
+            "hits": self.hits,
+            "hits_in_flight": self.hits_in_flight,
+            "misses": self.misses,
+            "wasted": self.wasted,
+            "hit_rate": (self.hits + self.hits_in_flight) / requests if requests else 0.0,
+        }
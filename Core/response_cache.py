@@ -0,0 +1,299 @@
+import os
+import json
+import asyncio
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Type
+
+from pydantic import BaseModel
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from Core.singleflight import singleflight
+
+
+# ==========================================
+# 1. KEYING
+# ==========================================
+
+def _normalize(value: Any) -> Any:
+    """Folds case and whitespace so trivially different inputs share a key."""
+    if isinstance(value, BaseModel):
+        return _normalize(value.model_dump())
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    return value
+
+
+def canonical_key(namespace: str, model_name: str, prompt_version: str, inputs: Any) -> str:
+    payload = json.dumps(
+        {
+            "ns": namespace,
+            "model": model_name,
+            "prompt": prompt_version,
+            "input": _normalize(inputs),
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ==========================================
+# 2. CACHE STORE (memory LRU + optional disk tier)
+# ==========================================
+
+class ResponseCache:
+    """
+    Two-tier cache for serialized chain outputs.
+    Memory is an LRU with TTL; the optional SQLite tier survives restarts
+    and is shared by every uvicorn worker pointing at the same file. Every
+    `prune_every` writes the disk tier drops expired rows and, beyond
+    `disk_max_entries`, the ones closest to expiry.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600,
+        disk_path: Optional[str] = None,
+        disk_max_entries: int = 100_000,
+        prune_every: int = 100,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self.disk_max_entries = disk_max_entries
+        self.prune_every = prune_every
+        self._writes = 0
+
+        self._memory: "OrderedDict[str, tuple[float, str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        self._counters: dict[str, dict[str, float]] = {}
+
+        if disk_path:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False, timeout=5)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, cost REAL NOT NULL)"
+            )
+            self._disk.execute("CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at)")
+            self._disk.commit()
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        return cls(
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024")),
+            ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600")),
+            disk_path=os.getenv("LLM_CACHE_PATH") or None,
+            disk_max_entries=int(os.getenv("LLM_CACHE_DISK_MAX_ENTRIES", "100000")),
+        )
+
+    def _count(self, namespace: str, field: str, amount: float = 1) -> None:
+        bucket = self._counters.setdefault(
+            namespace,
+            {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "saved_seconds": 0.0},
+        )
+        bucket[field] += amount
+
+    def count_coalesced(self, namespace: str = "default") -> None:
+        """A request that joined an identical one in flight instead of looking up."""
+        with self._lock:
+            self._count(namespace, "coalesced")
+
+    def get(self, key: str, namespace: str = "default") -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value, cost = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._count(namespace, "memory_hits")
+                    self._count(namespace, "saved_seconds", cost)
+                    return value
+                del self._memory[key]
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT value, expires_at, cost FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, expires_at, cost = row
+                    if expires_at > now:
+                        self._remember(key, value, expires_at, cost)
+                        self._count(namespace, "disk_hits")
+                        self._count(namespace, "saved_seconds", cost)
+                        return value
+                    self._disk.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._disk.commit()
+
+            self._count(namespace, "misses")
+            return None
+
+    def set(self, key: str, value: str, cost_seconds: float = 0.0) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember(key, value, expires_at, cost_seconds)
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires_at, cost) VALUES (?, ?, ?, ?)",
+                    (key, value, expires_at, cost_seconds),
+                )
+                self._writes += 1
+                if self._writes % self.prune_every == 0:
+                    self._prune()
+                self._disk.commit()
+
+    def _prune(self) -> None:
+        # Caller holds the lock; the deletes find their rows through the expires_at index.
+        self._disk.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        (rows,) = self._disk.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if rows > self.disk_max_entries:
+            self._disk.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY expires_at LIMIT ?)",
+                (rows - self.disk_max_entries,),
+            )
+
+    def _remember(self, key: str, value: str, expires_at: float, cost: float) -> None:
+        self._memory[key] = (expires_at, value, cost)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            namespaces = {ns: dict(counts) for ns, counts in self._counters.items()}
+            entries = len(self._memory)
+
+        totals = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "saved_seconds": 0.0}
+        for counts in namespaces.values():
+            for field in totals:
+                totals[field] += counts[field]
+        lookups = totals["memory_hits"] + totals["disk_hits"] + totals["misses"]
+
+        return {
+            **totals,
+            "hit_rate": (lookups - totals["misses"]) / lookups if lookups else 0.0,
+            "memory_entries": entries,
+            "disk_enabled": self._disk is not None,
+            "namespaces": namespaces,
+        }
+
+
+response_cache = ResponseCache.from_env()
+
+
+# ==========================================
+# 3. RUNNABLE WRAPPER
+# ==========================================
+
+class CachedRunnable(Runnable):
+    """
+    Wraps a `prompt | model | parser` chain so that identical normalized
+    inputs are answered from the cache instead of the provider.
+    """
+
+    def __init__(
+        self,
+        chain: Runnable,
+        *,
+        namespace: str,
+        model_name: str,
+        prompt_version: str,
+        output_model: Type[BaseModel],
+        cache: Optional[ResponseCache] = None,
+    ):
+        self.chain = chain
+        self.namespace = namespace
+        self.model_name = model_name
+        self.prompt_version = prompt_version
+        self.output_model = output_model
+        self.cache = cache or response_cache
+
+    def cache_key(self, inputs: Any) -> str:
+        return canonical_key(self.namespace, self.model_name, self.prompt_version, inputs)
+
+    def joins_in_flight(self, key: str) -> bool:
+        """
+        True when `key` (a cache key or stream key) is already being computed:
+        the caller joins that computation without a lookup, and is counted as
+        coalesced rather than as a cache miss.
+        """
+        if not singleflight.in_flight(key):
+            return False
+        self.cache.count_coalesced(self.namespace)
+        return True
+
+    def lookup(self, inputs: Any) -> Optional[BaseModel]:
+        cached = self.cache.get(self.cache_key(inputs), self.namespace)
+        if cached is None:
+            return None
+        return self.output_model.model_validate_json(cached)
+
+    def store(self, inputs: Any, result: BaseModel, cost_seconds: float = 0.0) -> None:
+        self.cache.set(self.cache_key(inputs), result.model_dump_json(), cost_seconds)
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> BaseModel:
+        cached = self.lookup(input)
+        if cached is not None:
+            return cached
+
+        started = time.perf_counter()
+        result = self.chain.invoke(input, config, **kwargs)
+        self.store(input, result, time.perf_counter() - started)
+        return result
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> BaseModel:
+        if self.joins_in_flight(self.cache_key(input)):
+            return await self.acompute(input, config, **kwargs)
+
+        # The SQLite tier does blocking I/O, keep it off the event loop.
+        on_disk = self.cache.disk_path is not None
+        cached = await asyncio.to_thread(self.lookup, input) if on_disk else self.lookup(input)
+        if cached is not None:
+            return cached
+        return await self.acompute(input, config, **kwargs)
+
+    async def acompute(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> BaseModel:
+        """Runs the chain and caches its answer, for callers that already missed the cache."""
+        on_disk = self.cache.disk_path is not None
+
+        async def compute() -> BaseModel:
+            started = time.perf_counter()
+            result = await self.chain.ainvoke(input, config, **kwargs)
+            if on_disk:
+                await asyncio.to_thread(self.store, input, result, time.perf_counter() - started)
+            else:
+                self.store(input, result, time.perf_counter() - started)
+            return result
+
+        # Identical requests arriving while this one is in flight share its result.
+        return await singleflight.do(self.cache_key(input), compute)
+
+
+def cached_chain(
+    chain: Runnable,
+    *,
+    namespace: str,
+    model_name: str,
+    prompt_version: str,
+    output_model: Type[BaseModel],
+) -> CachedRunnable:
+    return CachedRunnable(
+        chain,
+        namespace=namespace,
+        model_name=model_name,
+        prompt_version=prompt_version,
+        output_model=output_model,
+    )
@@ -0,0 +1,365 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import contextvars
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from Core.metrics import registry
+
+INTERACTIVE, SINGLE, BULK = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", SINGLE: "single", BULK: "bulk"}
+
+SCHED_ENABLED = os.getenv("SCHED_ENABLED", "1") == "1"
+# Output tokens assumed per call until the provider reports real usage.
+SCHED_OUTPUT_TOKENS = int(os.getenv("SCHED_OUTPUT_TOKENS", "1024"))
+# Share of a provider's slots bulk calls may hold, so interactive calls find one free.
+SCHED_BULK_SHARE = float(os.getenv("SCHED_BULK_SHARE", "0.75"))
+# Longest a call may wait for a slot before it is rejected, per priority.
+SCHED_DEADLINES = {
+    INTERACTIVE: float(os.getenv("SCHED_DEADLINE_INTERACTIVE_MS", "5000")) / 1000,
+    SINGLE: float(os.getenv("SCHED_DEADLINE_SINGLE_MS", "15000")) / 1000,
+    BULK: float(os.getenv("SCHED_DEADLINE_BULK_MS", "120000")) / 1000,
+}
+
+queue_wait_seconds = registry.histogram("llm_queue_wait_seconds", "Time LLM calls wait for a provider slot", ["provider", "priority"])
+rejected_total = registry.counter(
+    "llm_scheduler_rejected_total", "LLM calls rejected because they could not start before their deadline", ["provider", "priority"]
+)
+
+# Priority of LLM calls made from the current task; set with `priority(...)`.
+llm_priority: contextvars.ContextVar[int] = contextvars.ContextVar("llm_priority", default=SINGLE)
+
+
+@contextmanager
+def priority(level: int) -> Iterator[None]:
+    token = llm_priority.set(level)
+    try:
+        yield
+    finally:
+        llm_priority.reset(token)
+
+
+class SharedPriority:
+    """
+    Priority of work several callers wait on (a single-flight task runs in its
+    first caller's context): the most urgent of them. Raising it moves the
+    work's queued calls up and applies to every call it starts afterwards.
+    """
+
+    def __init__(self, level: int, parent: Optional["SharedPriority"] = None):
+        self.level = level
+        self.children: List["SharedPriority"] = []
+        self._queued: List[Tuple["ProviderLimiter", "_Waiter"]] = []
+        if parent is not None:
+            # Shared work started from inside shared work follows its parent up.
+            parent.children.append(self)
+
+    def raise_to(self, level: int) -> None:
+        if level >= self.level:
+            return
+        self.level = level
+        for limiter, waiter in list(self._queued):
+            limiter.promote(waiter, level)
+        for child in self.children:
+            child.raise_to(level)
+
+
+# Set inside single-flight tasks; LLM calls made there use its level when it is more urgent.
+shared_priority: contextvars.ContextVar[Optional[SharedPriority]] = contextvars.ContextVar("shared_priority", default=None)
+
+
+def current_priority() -> int:
+    shared = shared_priority.get()
+    level = llm_priority.get()
+    return min(level, shared.level) if shared is not None else level
+
+
+class SchedulerOverloaded(Exception):
+    def __init__(self, provider: str, level: int, retry_after: float):
+        super().__init__(f"{provider} is overloaded: {PRIORITY_NAMES[level]} request could not start in time")
+        self.provider = provider
+        self.level = level
+        self.retry_after = retry_after
+
+
+def _provider_env(provider: str, name: str, default: str) -> str:
+    return os.getenv(f"SCHED_{provider.upper()}_{name}", os.getenv(f"SCHED_{name}", default))
+
+
+def estimate_tokens(input: Any) -> int:
+    """Prompt tokens at ~4 characters each, plus the assumed output."""
+    if hasattr(input, "to_string"):
+        text = input.to_string()
+    elif isinstance(input, list):
+        text = "".join(str(getattr(m, "content", m)) for m in input)
+    else:
+        text = str(input)
+    return len(text) // 4 + SCHED_OUTPUT_TOKENS
+
+
+def _usage(output: Any) -> Optional[int]:
+    if isinstance(output, dict):
+        # with_structured_output(include_raw=True)
+        output = output.get("raw")
+    usage = getattr(output, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+
+# ==========================================
+# 1. TOKEN BUCKET
+# ==========================================
+
+class TokenBucket:
+    """Tokens per minute; a full minute's worth may be spent at once. `per_minute=0` means unlimited."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float) -> float:
+        if not self.rate:
+            return 0.0
+        self._refill()
+        return max(0.0, (min(cost, self.capacity) - self.tokens) / self.rate)
+
+    def take(self, cost: float) -> None:
+        if self.rate:
+            self._refill()
+            self.tokens -= min(cost, self.capacity)
+
+    def settle(self, estimated: float, actual: float) -> None:
+        # Charge (or refund) the difference once the provider reports real usage; may go into debt.
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens - (actual - estimated))
+
+
+# ==========================================
+# 2. PER-PROVIDER LIMITER
+# ==========================================
+
+@dataclass(order=True)
+class _Waiter:
+    level: int
+    seq: int
+    cost: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class ProviderLimiter:
+    """
+    At most `concurrency` calls in flight and `tokens_per_minute` spent per
+    provider, of which bulk calls may hold `bulk_share`. Waiting calls start
+    strictly by priority, then arrival order.
+    A call that cannot start before its deadline is rejected; when the
+    expected wait (from queue depth and recent call durations) already
+    exceeds the deadline it is rejected up front.
+    """
+
+    def __init__(self, provider: str, concurrency: int, tokens_per_minute: int, bulk_share: float = SCHED_BULK_SHARE):
+        self.provider = provider
+        self.concurrency = concurrency
+        self.bulk_limit = max(1, int(concurrency * bulk_share))
+        self.bucket = TokenBucket(tokens_per_minute)
+        self.in_flight = 0
+        self.bulk_in_flight = 0
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Moving average of how long a call holds its slot.
+        self.hold_seconds = 0.0
+        self.admitted = 0
+        self.rejected = 0
+
+    def queued(self, level: Optional[int] = None) -> int:
+        return sum(1 for w in self._waiters if not w.future.done() and (level is None or w.level == level))
+
+    def _has_slot(self, level: int) -> bool:
+        if self.in_flight >= self.concurrency:
+            return False
+        return level != BULK or self.bulk_in_flight < self.bulk_limit
+
+    def expected_wait(self, level: int, cost: int) -> float:
+        ahead = sum(1 for w in self._waiters if not w.future.done() and w.level <= level)
+        token_wait = self.bucket.wait_time(cost + sum(w.cost for w in self._waiters if not w.future.done() and w.level <= level))
+        if self._has_slot(level) and ahead == 0:
+            return token_wait
+        slots = self.bulk_limit if level == BULK else self.concurrency
+        return max(token_wait, (ahead + 1) / slots * self.hold_seconds)
+
+    def _reject(self, level: int, retry_after: float) -> SchedulerOverloaded:
+        self.rejected += 1
+        rejected_total.inc(self.provider, PRIORITY_NAMES[level])
+        return SchedulerOverloaded(self.provider, level, retry_after)
+
+    async def acquire(self, level: int, cost: int, deadline: float, shared: Optional[SharedPriority] = None) -> int:
+        """Waits for a slot; returns the level it was granted at, which `shared` may have raised."""
+        started = time.monotonic()
+        if self._has_slot(level) and not self.queued() and self.bucket.wait_time(cost) == 0:
+            self._grant(level, cost)
+        else:
+            expected = self.expected_wait(level, cost)
+            if expected > deadline:
+                raise self._reject(level, expected)
+            waiter = _Waiter(level, next(self._seq), cost, asyncio.get_running_loop().create_future())
+            heapq.heappush(self._waiters, waiter)
+            if shared is not None:
+                shared._queued.append((self, waiter))
+            self._dispatch()
+            try:
+                await asyncio.wait_for(waiter.future, deadline)
+            except asyncio.TimeoutError:
+                raise self._reject(waiter.level, self.expected_wait(waiter.level, cost))
+            except asyncio.CancelledError:
+                if waiter.future.done() and not waiter.future.cancelled():
+                    # Granted just as we were cancelled.
+                    self.release(waiter.level, 0.0)
+                raise
+            finally:
+                if shared is not None:
+                    shared._queued.remove((self, waiter))
+            level = waiter.level
+        queue_wait_seconds.observe(time.monotonic() - started, self.provider, PRIORITY_NAMES[level])
+        return level
+
+    def _grant(self, level: int, cost: int) -> None:
+        self.in_flight += 1
+        if level == BULK:
+            self.bulk_in_flight += 1
+        self.admitted += 1
+        self.bucket.take(cost)
+
+    def _dispatch(self) -> None:
+        self._timer = None
+        while self._waiters:
+            head = self._waiters[0]
+            if head.future.done():
+                # Timed out or cancelled while queued.
+                heapq.heappop(self._waiters)
+                continue
+            if not self._has_slot(head.level):
+                return
+            wait = self.bucket.wait_time(head.cost)
+            if wait > 0:
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self._grant(head.level, head.cost)
+            head.future.set_result(None)
+
+    def promote(self, waiter: _Waiter, level: int) -> None:
+        if waiter.future.done() or level >= waiter.level:
+            return
+        waiter.level = level
+        heapq.heapify(self._waiters)
+        self._dispatch()
+
+    def release(self, level: int, held: float) -> None:
+        self.in_flight -= 1
+        if level == BULK:
+            self.bulk_in_flight -= 1
+        if held:
+            self.hold_seconds = held if not self.hold_seconds else 0.8 * self.hold_seconds + 0.2 * held
+        self._dispatch()
+
+    def stats(self) -> Dict[str, float]:
+        stats = {
+            f"{self.provider}_in_flight": self.in_flight,
+            f"{self.provider}_admitted": self.admitted,
+            f"{self.provider}_rejected": self.rejected,
+        }
+        for level, name in PRIORITY_NAMES.items():
+            stats[f"{self.provider}_queued_{name}"] = self.queued(level)
+        if self.bucket.rate:
+            self.bucket.wait_time(0)
+            stats[f"{self.provider}_tokens_available"] = self.bucket.tokens
+        return stats
+
+
+# ==========================================
+# 3. SCHEDULER
+# ==========================================
+
+class Ticket:
+    """Handed to the caller holding a slot so real token usage can be settled."""
+
+    def __init__(self, limiter: ProviderLimiter, estimated: int):
+        self.limiter = limiter
+        self.estimated = estimated
+        self.used = 0
+
+    def observe(self, output: Any) -> None:
+        used = _usage(output)
+        if used:
+            self.used += used
+
+
+class Scheduler:
+    """
+    Process-wide gate in front of every LLM call. The model registry's lazy
+    models acquire a slot from the provider's limiter for each async call
+    (for streams, until the stream ends); priority comes from `llm_priority`,
+    raised to the most urgent waiter's for work shared through single-flight.
+    Limits are read per provider from SCHED_<PROVIDER>_CONCURRENCY /
+    SCHED_<PROVIDER>_TPM, falling back to SCHED_CONCURRENCY / SCHED_TPM.
+    """
+
+    def __init__(self, enabled: bool = SCHED_ENABLED):
+        self.enabled = enabled
+        self._limiters: Dict[str, ProviderLimiter] = {}
+
+    def limiter(self, provider: str) -> ProviderLimiter:
+        limiter = self._limiters.get(provider)
+        if limiter is None:
+            limiter = self._limiters[provider] = ProviderLimiter(
+                provider,
+                concurrency=int(_provider_env(provider, "CONCURRENCY", "32")),
+                tokens_per_minute=int(_provider_env(provider, "TPM", "0")),
+            )
+        return limiter
+
+    def overloaded(self, provider: str, level: int) -> Optional[SchedulerOverloaded]:
+        """Admission check for routes that must answer 503 before they start streaming."""
+        if not self.enabled:
+            return None
+        limiter = self.limiter(provider)
+        expected = limiter.expected_wait(level, SCHED_OUTPUT_TOKENS)
+        return limiter._reject(level, expected) if expected > SCHED_DEADLINES[level] else None
+
+    @asynccontextmanager
+    async def slot(self, provider: str, input: Any) -> AsyncIterator[Optional[Ticket]]:
+        if not self.enabled:
+            yield None
+            return
+        limiter = self.limiter(provider)
+        level = current_priority()
+        cost = estimate_tokens(input)
+        level = await limiter.acquire(level, cost, SCHED_DEADLINES[level], shared_priority.get())
+        ticket = Ticket(limiter, cost)
+        started = time.monotonic()
+        try:
+            yield ticket
+        finally:
+            if ticket.used:
+                limiter.bucket.settle(cost, ticket.used)
+            limiter.release(level, time.monotonic() - started)
+
+    def stats(self) -> Dict[str, float]:
+        stats: Dict[str, float] = {}
+        for limiter in self._limiters.values():
+            stats.update(limiter.stats())
+        return stats
+
+
+scheduler = Scheduler()
@@ -0,0 +1,131 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+from Core.scheduler import SharedPriority, current_priority, shared_priority
+
+
+class _Broadcast:
+    """One upstream async iterator replayed to any number of subscribers."""
+
+    def __init__(self, source: AsyncIterator[Any], on_finish: Callable[["_Broadcast"], None], urgency: SharedPriority):
+        self.items: list = []
+        self.urgency = urgency
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self._on_finish = on_finish
+        self.task = asyncio.create_task(self._pump(source))
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _pump(self, source: AsyncIterator[Any]) -> None:
+        try:
+            async for item in source:
+                self.items.append(item)
+                self._notify()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._on_finish(self)
+            self._notify()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        self.subscribers += 1
+        index = 0
+        try:
+            while True:
+                # Late joiners replay everything produced so far.
+                while index < len(self.items):
+                    yield self.items[index]
+                    index += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                # Nobody is listening any more: stop paying for tokens.
+                self.task.cancel()
+                self._on_finish(self)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical work.
+    Callers with the same key while a call is in flight await the same task
+    (or, for streams, receive the same token stream) instead of starting another.
+    The shared work runs at the most urgent of its callers' priorities, so an
+    interactive request joining a bulk one is not queued behind bulk work.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Tuple[asyncio.Task, SharedPriority]] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls or key in self._streams
+
+    @staticmethod
+    def _shared(start: Callable[[], Any]) -> Tuple[Any, SharedPriority]:
+        # Tasks copy the current context, so LLM calls inside read the shared level.
+        urgency = SharedPriority(current_priority(), parent=shared_priority.get())
+        token = shared_priority.set(urgency)
+        try:
+            return start(), urgency
+        finally:
+            shared_priority.reset(token)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            self.leaders += 1
+            call = self._calls[key] = self._shared(lambda: asyncio.create_task(fn()))
+            call[0].add_done_callback(lambda t: self._forget_call(key, t))
+        else:
+            self.followers += 1
+            call[1].raise_to(current_priority())
+        # Shielded so one caller disconnecting does not cancel the others' result.
+        return await asyncio.shield(call[0])
+
+    def _forget_call(self, key: str, task: asyncio.Task) -> None:
+        call = self._calls.get(key)
+        if call is not None and call[0] is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved; callers already received it
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            self.leaders += 1
+            broadcast, _ = self._shared(
+                lambda: _Broadcast(factory(), lambda b: self._forget_stream(key, b), shared_priority.get())
+            )
+            self._streams[key] = broadcast
+        else:
+            self.followers += 1
+            broadcast.urgency.raise_to(current_priority())
+        async for item in broadcast.subscribe():
+            yield item
+
+    def _forget_stream(self, key: str, broadcast: _Broadcast) -> None:
+        if self._streams.get(key) is broadcast:
+            del self._streams[key]
+
+    def stats(self) -> dict:
+        return {
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "in_flight": len(self._calls) + len(self._streams),
+        }
+
+
+singleflight = SingleFlight()
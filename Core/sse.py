@@ -0,0 +1,102 @@
+import os
+import time
+import asyncio
+from typing import AsyncIterator, List, Optional
+
+SSE_FLUSH_INTERVAL = float(os.getenv("SSE_FLUSH_INTERVAL_MS", "30")) / 1000
+SSE_MAX_FRAME_CHARS = int(os.getenv("SSE_MAX_FRAME_CHARS", "2048"))
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+# Tokens buffered ahead of a slow client before we stop reading from the provider.
+SSE_MAX_PENDING = int(os.getenv("SSE_MAX_PENDING_TOKENS", "256"))
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+HEARTBEAT = ": keep-alive\n\n"
+
+_DONE = object()
+
+
+def format_event(data: str, event: Optional[str] = None) -> str:
+    """One SSE frame; every line of `data` gets its own `data:` field so newlines survive."""
+    lines = data.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    head = f"event: {event}\n" if event else ""
+    return head + "".join(f"data: {line}\n" for line in lines) + "\n"
+
+
+async def coalesced_events(
+    tokens: AsyncIterator[str],
+    flush_interval: float = SSE_FLUSH_INTERVAL,
+    max_frame_chars: int = SSE_MAX_FRAME_CHARS,
+    heartbeat: float = SSE_HEARTBEAT_SECONDS,
+) -> AsyncIterator[str]:
+    """
+    Turns a token stream into SSE frames. The first token is sent at once;
+    later tokens are batched into one frame per `flush_interval` (or sooner
+    once `max_frame_chars` are waiting). Idle streams get comment heartbeats.
+
+    Tokens are read by a separate task into a bounded queue, so a slow
+    client stops us reading from the provider. When the response is
+    cancelled (Starlette does this on client disconnect) the reader task is
+    cancelled, which closes the upstream model stream.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=SSE_MAX_PENDING)
+
+    async def pump() -> None:
+        try:
+            async for token in tokens:
+                if token:
+                    await queue.put(token)
+            await queue.put(_DONE)
+        except Exception as e:
+            await queue.put(e)
+        finally:
+            # Also runs on cancellation while blocked on a full queue.
+            aclose = getattr(tokens, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    reader = asyncio.create_task(pump())
+    buffer: List[str] = []
+    size = 0
+    deadline = 0.0
+    first = True
+
+    def flush() -> str:
+        nonlocal size
+        frame = format_event("".join(buffer))
+        buffer.clear()
+        size = 0
+        return frame
+
+    try:
+        while True:
+            if not queue.empty():
+                # Tokens arrive in bursts; drain them without arming a timer per token.
+                item = queue.get_nowait()
+            else:
+                timeout = max(0.0, deadline - time.monotonic()) if buffer else heartbeat
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield flush() if buffer else HEARTBEAT
+                    continue
+
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                if buffer:
+                    yield flush()
+                yield format_event(f"Error: {item}")
+                break
+
+            if not buffer:
+                deadline = time.monotonic() + flush_interval
+            buffer.append(item)
+            size += len(item)
+            if first or size >= max_frame_chars or time.monotonic() >= deadline:
+                first = False
+                yield flush()
+
+        if buffer:
+            yield flush()
+    finally:
+        reader.cancel()
@@ -0,0 +1,258 @@
+import os
+import json
+import logging
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+from pydantic import BaseModel
+from langchain_core.exceptions import OutputParserException
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from Core.json_repair import JsonRepairParser, RepairedJson, message_text, repair_json, salvage
+from Core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# "native": provider JSON-schema mode, falling back to the prompt hint.
+# "hint": always put the compact schema hint in the prompt.
+STRUCTURED_OUTPUT_MODE = os.getenv("STRUCTURED_OUTPUT_MODE", "native")
+
+NATIVE_INSTRUCTIONS = "Respond with a JSON object matching the response schema."
+
+structured_output_total = registry.counter(
+    "llm_structured_output_total",
+    "Structured answers by outcome: clean, repaired, salvaged, topped_up, regenerated, failed",
+    ["schema", "outcome"],
+)
+
+_SCALARS = {"string": "string", "integer": "int", "number": "number", "boolean": "bool", "null": "null"}
+
+
+# ==========================================
+# 1. COMPACT SCHEMA HINT
+# ==========================================
+
+def _render(schema: dict, defs: dict, depth: int) -> str:
+    if "$ref" in schema:
+        return _render(defs[schema["$ref"].rsplit("/", 1)[-1]], defs, depth)
+    if "anyOf" in schema:
+        return " | ".join(_render(option, defs, depth) for option in schema["anyOf"] if option.get("type") != "null")
+    if "enum" in schema:
+        return " | ".join(json.dumps(value, ensure_ascii=False) for value in schema["enum"])
+    if "const" in schema:
+        return json.dumps(schema["const"], ensure_ascii=False)
+
+    kind = schema.get("type")
+    if kind == "array":
+        return f"[{_render(schema.get('items', {}), defs, depth)}, ...]"
+    if kind == "object" and "properties" in schema:
+        pad = "  " * (depth + 1)
+        required = set(schema.get("required", []))
+        names = list(schema["properties"])
+        lines = []
+        for i, name in enumerate(names):
+            prop = schema["properties"][name]
+            line = f'{pad}"{name}"{"" if name in required else "?"}: {_render(prop, defs, depth + 1)}'
+            if i < len(names) - 1:
+                line += ","
+            if prop.get("description"):
+                line += f"  // {prop['description']}"
+            lines.append(line)
+        return "{\n" + "\n".join(lines) + "\n" + "  " * depth + "}"
+    return _SCALARS.get(kind, "any")
+
+
+@lru_cache(maxsize=None)
+def schema_hint(output_model: Type[BaseModel]) -> str:
+    """
+    The output shape as a short annotated JSON sketch, a fraction of the
+    size of `PydanticOutputParser.get_format_instructions()`.
+    """
+    schema = output_model.model_json_schema()
+    shape = _render(schema, schema.get("$defs", {}), 0)
+    return f'Return only a JSON object of this shape (no markdown; keys marked "?" may be omitted):\n{shape}'
+
+
+# ==========================================
+# 2. STRUCTURED CHAIN
+# ==========================================
+
+def _native_unsupported(error: Exception) -> bool:
+    # Only a rejection of the schema request itself; other 400s (context length, bad input)
+    # are re-raised and leave native mode on.
+    if isinstance(error, NotImplementedError):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status not in (400, 422):
+        return False
+    detail = f"{error} {getattr(error, 'body', '') or ''}".lower()
+    return "response_format" in detail or "json_schema" in detail
+
+
+Attempt = Optional[Tuple[BaseModel, str]]
+
+
+class StructuredChain(Runnable):
+    """
+    `prompt | model | parser` returning `output_model`. Uses the provider's
+    native JSON-schema output, so the schema stays out of the prompt, or the
+    compact schema hint when native output is off or rejected.
+
+    Answers that do not parse are repaired locally (fences, trailing commas,
+    truncation) and salvaged item by item; `defaults(inputs)` fills missing
+    top-level fields. If `top_up(inputs, result)` returns inputs, only that
+    missing portion is requested again and combined with `merge`. A full
+    second generation happens only when nothing could be salvaged, or when a
+    truncated answer still fails `complete(inputs, result)` after any top-up;
+    if the second one falls short too the call fails rather than return (and
+    get cached as) a partial answer.
+
+    `prompt` must have a `{format_instructions}` variable.
+    """
+
+    def __init__(
+        self,
+        prompt: PromptTemplate,
+        output_model: Type[BaseModel],
+        model: Runnable,
+        mode: str = STRUCTURED_OUTPUT_MODE,
+        defaults: Optional[Callable[[dict], Dict[str, Any]]] = None,
+        top_up: Optional[Callable[[dict, BaseModel], Optional[dict]]] = None,
+        merge: Optional[Callable[[BaseModel, BaseModel], BaseModel]] = None,
+        complete: Optional[Callable[[dict, BaseModel], bool]] = None,
+    ):
+        self.output_model = output_model
+        self.defaults = defaults
+        self.top_up = top_up
+        self.merge = merge
+        self.complete = complete
+        self.hint_prompt = prompt.partial(format_instructions=schema_hint(output_model))
+        self.hint_chain = self.hint_prompt | model | JsonRepairParser()
+        self.native_chain: Optional[Runnable] = None
+        if mode == "native" and hasattr(model, "with_structured_output"):
+            native_prompt = prompt.partial(format_instructions=NATIVE_INSTRUCTIONS)
+            self.native_chain = native_prompt | model.with_structured_output(output_model, method="json_schema", include_raw=True)
+        self.name = None
+
+    def _count(self, outcome: str) -> None:
+        structured_output_total.inc(self.output_model.__name__, outcome)
+
+    def _disable_native(self, error: Exception) -> None:
+        logger.warning("Native structured output unavailable for %s, using schema hints: %s", self.output_model.__name__, error)
+        self.native_chain = None
+
+    def _check(self, input: dict, text: Optional[str] = None, repaired: Optional[RepairedJson] = None) -> Attempt:
+        try:
+            repaired = repaired if repaired is not None else repair_json(text)
+        except OutputParserException:
+            return None
+        result, changed = salvage(self.output_model, repaired.value, self.defaults(input) if self.defaults else None)
+        if result is None:
+            return None
+        if not repaired.complete:
+            return result, "salvaged"
+        return result, "repaired" if repaired.repaired or changed else "clean"
+
+    def _from_native(self, input: dict, answer: dict) -> Attempt:
+        if answer.get("parsed") is not None:
+            return answer["parsed"], "clean"
+        return self._check(input, text=message_text(answer["raw"]))
+
+    def _attempt(self, input: Any, config: Optional[RunnableConfig], native: bool = True, **kwargs: Any) -> Attempt:
+        if native and self.native_chain is not None:
+            try:
+                return self._from_native(input, self.native_chain.invoke(input, config, **kwargs))
+            except Exception as e:
+                if not _native_unsupported(e):
+                    raise
+                self._disable_native(e)
+        try:
+            repaired = self.hint_chain.invoke(input, config, **kwargs)
+        except OutputParserException:
+            return None
+        return self._check(input, repaired=repaired)
+
+    async def _aattempt(self, input: Any, config: Optional[RunnableConfig], native: bool = True, **kwargs: Any) -> Attempt:
+        if native and self.native_chain is not None:
+            try:
+                return self._from_native(input, await self.native_chain.ainvoke(input, config, **kwargs))
+            except Exception as e:
+                if not _native_unsupported(e):
+                    raise
+                self._disable_native(e)
+        try:
+            repaired = await self.hint_chain.ainvoke(input, config, **kwargs)
+        except OutputParserException:
+            return None
+        return self._check(input, repaired=repaired)
+
+    def _usable(self, input: dict, attempt: Attempt) -> bool:
+        # A truncated answer that is still short of what was asked for is never passed off as complete.
+        if attempt is None:
+            return False
+        result, outcome = attempt
+        return outcome != "salvaged" or self.complete is None or self.complete(input, result)
+
+    def _accept(self, attempt: Attempt) -> BaseModel:
+        if attempt is None:
+            self._count("failed")
+            raise OutputParserException(f"Could not parse a complete {self.output_model.__name__} from model output")
+        result, outcome = attempt
+        self._count(outcome)
+        return result
+
+    def _topped_up(self, input: dict, attempt: Attempt, config: Optional[RunnableConfig], **kwargs: Any) -> Attempt:
+        follow_up = self.top_up(input, attempt[0]) if attempt is not None and self.top_up else None
+        if follow_up is None:
+            return attempt
+        extra = self._attempt(follow_up, config, **kwargs)
+        if extra is None:
+            return attempt
+        self._count("topped_up")
+        return self.merge(attempt[0], extra[0]), attempt[1]
+
+    async def _atopped_up(self, input: dict, attempt: Attempt, config: Optional[RunnableConfig], **kwargs: Any) -> Attempt:
+        follow_up = self.top_up(input, attempt[0]) if attempt is not None and self.top_up else None
+        if follow_up is None:
+            return attempt
+        extra = await self._aattempt(follow_up, config, **kwargs)
+        if extra is None:
+            return attempt
+        self._count("topped_up")
+        return self.merge(attempt[0], extra[0]), attempt[1]
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> BaseModel:
+        attempt = self._topped_up(input, self._attempt(input, config, **kwargs), config, **kwargs)
+        if not self._usable(input, attempt):
+            # Nothing usable, or a partial answer the top-up could not complete:
+            # the only cases that pay for a full second generation.
+            self._count("regenerated")
+            attempt = self._topped_up(input, self._attempt(input, config, native=False, **kwargs), config, **kwargs)
+            if not self._usable(input, attempt):
+                attempt = None
+        return self._accept(attempt)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> BaseModel:
+        attempt = await self._atopped_up(input, await self._aattempt(input, config, **kwargs), config, **kwargs)
+        if not self._usable(input, attempt):
+            # Nothing usable, or a partial answer the top-up could not complete:
+            # the only cases that pay for a full second generation.
+            self._count("regenerated")
+            attempt = await self._atopped_up(input, await self._aattempt(input, config, native=False, **kwargs), config, **kwargs)
+            if not self._usable(input, attempt):
+                attempt = None
+        return self._accept(attempt)
+
+
+def structured_chain(
+    prompt: PromptTemplate,
+    output_model: Type[BaseModel],
+    model: Runnable,
+    *,
+    defaults: Optional[Callable[[dict], Dict[str, Any]]] = None,
+    top_up: Optional[Callable[[dict, BaseModel], Optional[dict]]] = None,
+    merge: Optional[Callable[[BaseModel, BaseModel], BaseModel]] = None,
+    complete: Optional[Callable[[dict, BaseModel], bool]] = None,
+) -> StructuredChain:
+    return StructuredChain(prompt, output_model, model, defaults=defaults, top_up=top_up, merge=merge, complete=complete)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel,Field
+from pydantic import AliasChoices, BaseModel,Field
 from typing import List,Literal
 
 class TestGenInput(BaseModel):
@@ -14,5 +14,6 @@ class Question(BaseModel):
     
 class TestGenOutput(BaseModel):
     topic:str
-    difficuly:str
+    # Models often spell it correctly; accept both, keep the published field name.
+    difficuly:str=Field(validation_alias=AliasChoices("difficuly","difficulty"))
     questions:List[Question]
\ No newline at end of file
@@ -0,0 +1,99 @@
+"""
+Content library lookup latency with a large library: fills a temporary
+SQLite file with synthetic topics, then times exact (reworded), fuzzy
+(subject reworded), near-miss (one extra topic word, must not match) and
+missing lookups.
+
+    python -m benchmarks.content_library --topics 300000
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from typing import Callable, List, Tuple
+
+from Core.content_library import ContentLibrary
+
+SUBJECTS = ["Biology", "Chemistry", "Physics", "Mathematics", "History", "Geography", "Economics", "Computer Science",
+            "English Grammar", "Environmental Science", "Astronomy", "Civics"]
+LANGUAGES = ["en", "hi", "mr"]
+AGES = [7, 9, 12, 15, 18]
+
+
+def _vocabulary(size: int, rng: random.Random) -> List[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(4, 10))))
+    return sorted(words)
+
+
+def _fill(library: ContentLibrary, count: int, vocabulary: List[str], rng: random.Random) -> List[Tuple[str, str, str, int]]:
+    rows = []
+    content = '{"topic_name": "x", "explanation": "' + "text " * 400 + '", "practice_questions": []}'
+    # Durability is irrelevant for a throwaway file; keeps the per-topic commits cheap.
+    library._db.execute("PRAGMA synchronous=OFF")
+    for _ in range(count):
+        subject = rng.choice(SUBJECTS)
+        topic = " ".join(rng.sample(vocabulary, rng.randint(1, 4)))
+        language, age = rng.choice(LANGUAGES), rng.choice(AGES)
+        rows.append((subject, topic, language, age))
+        library.store(subject, topic, language, age, content)
+    return rows
+
+
+def _time(fn: Callable[[], object], repeat: int) -> Tuple[float, float, int]:
+    samples, hits = [], 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        if fn() is not None:
+            hits += 1
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1], hits
+
+
+def main():
+    cli = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cli.add_argument("--topics", type=int, default=300_000)
+    cli.add_argument("--lookups", type=int, default=2000)
+    args = cli.parse_args()
+
+    rng = random.Random(7)
+    vocabulary = _vocabulary(5000, rng)
+    with tempfile.TemporaryDirectory() as tmp:
+        library = ContentLibrary(os.path.join(tmp, "library.db"))
+        started = time.perf_counter()
+        rows = _fill(library, args.topics, vocabulary, rng)
+        print(f"stored {args.topics} topics in {time.perf_counter() - started:.1f}s, "
+              f"{os.path.getsize(os.path.join(tmp, 'library.db')) / 1e6:.0f} MB")
+
+        def reworded():
+            subject, topic, language, age = rng.choice(rows)
+            words = topic.split()
+            rng.shuffle(words)
+            return library.lookup(subject.lower(), "Introduction to " + " ".join(w + "s" for w in words), language, age + 1)
+
+        def other_subject():
+            subject, topic, language, age = rng.choice(rows)
+            return library.lookup(subject + " class", topic, language, age)
+
+        def extra_word():
+            subject, topic, language, age = rng.choice(rows)
+            return library.lookup(subject, topic + " " + rng.choice(vocabulary), language, age)
+
+        def missing():
+            subject, _, language, age = rng.choice(rows)
+            return library.lookup(subject, " ".join(rng.sample(vocabulary, 2)) + " zzz", language, age)
+
+        print(f"{'lookup':<26}{'p50 µs':>9}{'p99 µs':>9}{'hits':>8}")
+        for name, fn in [("exact (reworded)", reworded), ("fuzzy (subject reworded)", other_subject),
+                         ("one extra topic word", extra_word), ("miss", missing)]:
+            p50, p99, hits = _time(fn, args.lookups)
+            print(f"{name:<26}{p50:>9.0f}{p99:>9.0f}{hits / args.lookups:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Deterministic local stand-ins for Cerebras, Gemini and Sarvam.
+
+`install()` registers them with the model registry in place of the real
+providers: fakes that wait a configurable time-to-first-token, emit tokens
+at a fixed rate, and answer with canned JSON that is valid for the
+requesting chain.
+"""
+import io
+import os
+import re
+import json
+import time
+import wave
+import base64
+import asyncio
+import itertools
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.runnables import RunnableLambda
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+@dataclass
+class FakeProviderConfig:
+    ttft: float = 0.3                # seconds before the first token
+    tokens_per_second: float = 400.0
+    chars_per_token: int = 4
+    explanation_chars: int = 2000
+    tts_latency: float = 0.4         # seconds per synthesized chunk
+
+
+CONFIG = FakeProviderConfig()
+_counter = itertools.count()
+
+
+# ==========================================
+# 1. CANNED ANSWERS
+# ==========================================
+
+# Realistic topic name lengths, so planner output takes as long to stream as a real plan.
+PLANNED_TOPICS = [
+    "What living things need to survive",
+    "Parts of a plant and what they do",
+    "How leaves capture sunlight",
+    "Water and carbon dioxide in photosynthesis",
+    "Glucose, starch and how plants store food",
+    "Photosynthesis and the oxygen we breathe",
+]
+
+
+def _question(n: int) -> dict:
+    return {
+        "question": f"Sample question {n}: which option is correct?",
+        "options": ["Option A", "Option B", "Option C", "Option D"],
+        "correct_index": n % 4,
+    }
+
+
+def canned_answer(prompt: str) -> str:
+    """Picks a schema-valid answer from markers in the chain's prompt."""
+    if "curriculum designer" in prompt:
+        return json.dumps({"topics": [f"Topic {i + 1}: {name}" for i, name in enumerate(PLANNED_TOPICS)]})
+
+    if "expert tutor" in prompt:
+        sentence = "Plants use sunlight, water and carbon dioxide to make food. "
+        explanation = (sentence * (CONFIG.explanation_chars // len(sentence) + 1))[:CONFIG.explanation_chars]
+        return json.dumps({
+            "topic_name": "Topic",
+            "explanation": explanation,
+            "practice_questions": [_question(next(_counter)) for _ in range(5)],
+        })
+
+    if "exam paper generator" in prompt:
+        match = re.search(r"Number of questions:\s*(\d+)", prompt)
+        count = int(match.group(1)) if match else 5
+        return json.dumps({
+            "topic": "Benchmark",
+            "difficuly": "easy",
+            "questions": [_question(next(_counter)) for _ in range(count)],
+        })
+
+    if "evaluating a student's quiz attempt" in prompt:
+        return json.dumps({
+            "understanding_level": "Intermediate",
+            "score_commentary": "Good effort, most answers were right.",
+            "strengths": ["Chlorophyll"],
+            "weaknesses": ["Light reactions"],
+            "suggestions": ["Revise the chapter"],
+            "study_plan": ["Review diagrams", "Practice questions", "Summarize notes"],
+            "feedback": "Well done, keep practicing.",
+        })
+
+    return "This is a streamed chat answer from the local fake model. " * 8
+
+
+def _prompt_text(messages: List[BaseMessage]) -> str:
+    return "\n".join(str(m.content) for m in messages)
+
+
+def _tokens(text: str) -> List[str]:
+    size = CONFIG.chars_per_token
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+# ==========================================
+# 2. CHAT MODEL
+# ==========================================
+
+class FakeChatModel(BaseChatModel):
+    model_name: str = "fake"
+    streaming: bool = False
+
+    def __init__(self, model: Optional[str] = None, **kwargs: Any):
+        kwargs = {k: v for k, v in kwargs.items() if k in ("streaming",)}
+        super().__init__(**kwargs)
+        if model:
+            self.model_name = model
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def with_structured_output(self, schema: Any, *, include_raw: bool = False, **kwargs: Any):
+        # Canned answers already match the schema; parse them like the provider SDK would.
+        parser = PydanticOutputParser(pydantic_object=schema)
+        if not include_raw:
+            return self | parser
+
+        def parse(message: BaseMessage) -> dict:
+            try:
+                return {"raw": message, "parsed": parser.invoke(message), "parsing_error": None}
+            except Exception as e:
+                return {"raw": message, "parsed": None, "parsing_error": e}
+
+        return self | RunnableLambda(parse)
+
+    def _result(self, prompt: str, text: str) -> ChatResult:
+        usage = {
+            "input_tokens": len(_tokens(prompt)),
+            "output_tokens": len(_tokens(text)),
+            "total_tokens": len(_tokens(prompt)) + len(_tokens(text)),
+        }
+        message = AIMessage(content=text, usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = _prompt_text(messages)
+        text = canned_answer(prompt)
+        time.sleep(CONFIG.ttft + len(_tokens(text)) / CONFIG.tokens_per_second)
+        return self._result(prompt, text)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = _prompt_text(messages)
+        text = canned_answer(prompt)
+        await asyncio.sleep(CONFIG.ttft + len(_tokens(text)) / CONFIG.tokens_per_second)
+        return self._result(prompt, text)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        time.sleep(CONFIG.ttft)
+        for token in _tokens(canned_answer(_prompt_text(messages))):
+            time.sleep(1 / CONFIG.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(CONFIG.ttft)
+        tokens = _tokens(canned_answer(_prompt_text(messages)))
+        # Sleep per batch of tokens: per-token timers would dominate the profile.
+        batch = max(1, int(CONFIG.tokens_per_second / 50))
+        for i in range(0, len(tokens), batch):
+            await asyncio.sleep(len(tokens[i:i + batch]) / CONFIG.tokens_per_second)
+            for token in tokens[i:i + batch]:
+                yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+# ==========================================
+# 3. SARVAM
+# ==========================================
+
+def _silent_wav(seconds: float = 1.0, framerate: int = 22050) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(framerate)
+        wav.writeframes(b"\x00\x00" * int(seconds * framerate))
+    return buffer.getvalue()
+
+
+class _FakeTextToSpeech:
+    _audio = base64.b64encode(_silent_wav()).decode()
+
+    async def convert(self, **kwargs: Any) -> dict:
+        await asyncio.sleep(CONFIG.tts_latency)
+        return {"audios": [self._audio]}
+
+
+class FakeAsyncSarvamAI:
+    def __init__(self, *args: Any, **kwargs: Any):
+        self.text_to_speech = _FakeTextToSpeech()
+
+
+# ==========================================
+# 4. INSTALL
+# ==========================================
+
+def install(config: Optional[FakeProviderConfig] = None) -> None:
+    global CONFIG
+    if config is not None:
+        CONFIG = config
+
+    for key in ("CEREBRAS_API_KEY", "GOOGLE_API_KEY", "SARVAM_API_KEY"):
+        os.environ.setdefault(key, "benchmark")
+
+    from Core.model_registry import model_registry
+
+    fake_chat = lambda registry, model, streaming: FakeChatModel(model=model, streaming=streaming)
+    model_registry.register("cerebras", fake_chat)
+    model_registry.register("google", fake_chat)
+    model_registry.register("sarvam", lambda registry, model, streaming: FakeAsyncSarvamAI())
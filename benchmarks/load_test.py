@@ -0,0 +1,373 @@
+"""
+Load test of every main.py route against local fake providers.
+
+Requests are driven straight through the ASGI app (no sockets), so the
+numbers measure this service's own overhead on top of the simulated
+provider latency. Fakes and inputs are deterministic; save a run with
+--json and pass it to --compare on a later run to spot regressions.
+Routes that only work as a sequence of requests (a multi-turn chat
+session, a background job followed to its result) run as flows.
+
+    python -m benchmarks.load_test --requests 200 --concurrency 50
+    python -m benchmarks.load_test --routes chat_stream,test_generate --warm
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+from dataclasses import dataclass, asdict, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from benchmarks import fakes
+
+
+# ==========================================
+# 1. ROUTES
+# ==========================================
+
+def _learner(i: int) -> dict:
+    return {"subject": f"Photosynthesis {i}", "year_old": 12, "preferred_language": "en"}
+
+def _results(i: int) -> list:
+    return [
+        {
+            "question": f"Question {q} of attempt {i}",
+            "selected_option_index": (q + i) % 4,
+            "correct_option_index": q % 4,
+            "options": ["A", "B", "C", "D"],
+        }
+        for q in range(10)
+    ]
+
+def _quiz_items(i: int) -> list:
+    return [
+        {"question": f"Question {q} of attempt {i}", "options": ["A", "B", "C", "D"],
+         "correct_index": q % 4, "selected_index": (q + i) % 4}
+        for q in range(10)
+    ]
+
+# A small class, a typical one and a whole year group; each request takes the next size.
+CLASS_SIZES = (25, 40, 120)
+CLASS_QUESTIONS = 20
+
+def _answer(rng: random.Random, ability: float, difficulty: float, correct: int) -> int:
+    if rng.random() < 0.03:
+        return -1
+    # Stronger students and easier questions go together (a two-parameter logistic model),
+    # so students miss overlapping sets of questions as they do in a real class.
+    if rng.random() < 1 / (1 + math.exp(-3 * (ability - difficulty))):
+        return correct
+    # Most wrong answers land on the question's one tempting distractor.
+    return (correct + 1) % 4 if rng.random() < 0.6 else rng.choice([o for o in range(4) if o != correct])
+
+def _class(i: int) -> dict:
+    rng = random.Random(i)
+    size = CLASS_SIZES[i % len(CLASS_SIZES)]
+    key = [q % 4 for q in range(CLASS_QUESTIONS)]
+    difficulty = [rng.uniform(-1.5, 1.5) for _ in key]
+    submissions = []
+    for s in range(size):
+        ability = rng.gauss(0.8, 1.0)
+        submissions.append({
+            "student_id": f"s{s}",
+            "selected_indices": [_answer(rng, ability, d, k) for d, k in zip(difficulty, key)],
+        })
+    return {
+        "topic": f"Cells {i}",
+        "language": "en",
+        "questions": [
+            {"question": f"Question {q}", "options": ["A", "B", "C", "D"], "correct_index": k}
+            for q, k in enumerate(key)
+        ],
+        "submissions": submissions,
+    }
+
+# name -> (method, path, builder(i) -> (json body, query params), streamed response)
+ROUTES: Dict[str, Tuple[str, str, Callable[[int], Tuple[Optional[dict], Optional[dict]]], bool]] = {
+    "chat_stream": ("GET", "/chat/stream", lambda i: (None, {"question": f"Explain osmosis {i}"}), True),
+    "test_generate": ("POST", "/test/generate", lambda i: ({"topic": f"Cells {i}", "difficulty": "easy", "num_questions": 10, "language": "en"}, None), False),
+    "test_generate_stream": ("POST", "/test/generate/stream", lambda i: ({"topic": f"Cells {i}", "difficulty": "easy", "num_questions": 10, "language": "en"}, None), True),
+    "learning_path": ("POST", "/learning_path/generate", lambda i: (_learner(i), None), False),
+    "learning_path_stream": ("POST", "/learning_path/generate/stream", lambda i: (_learner(i), None), True),
+    "topic_list": ("POST", "/learning_path/generate/topic_list", lambda i: (_learner(i), None), False),
+    "topic_detail": ("POST", "/learning_path/generate/topic_detail", lambda i: ({"payload": _learner(i), "topic_name": "Light"}, None), False),
+    "topic_detail_stream": ("POST", "/learning_path/generate/topic_detail/stream", lambda i: ({"payload": _learner(i), "topic_name": "Light"}, None), True),
+    "tts": ("POST", "/generate_tts/", lambda i: ({"text": f"Lesson {i}. " + "Plants make food from light. " * 40, "language": "en"}, None), True),
+    "feedback": ("POST", "/generate_feedback", lambda i: ({"topic": f"Cells {i}", "questions": _quiz_items(i), "correct_questions": [], "incorrect_questions": _quiz_items(i)}, None), False),
+    "test_analyze": ("POST", "/test/analyze", lambda i: ({"topic": f"Cells {i}", "language": "en", "results": _results(i)}, None), False),
+    "test_analyze_batch": ("POST", "/test/analyze/batch", lambda i: (_class(i), None), False),
+}
+
+CHAT_TURNS = 4
+
+async def _chat_session(app, i: int) -> List["Sample"]:
+    # An unknown id starts a session; later turns send back the X-Session-Id the server issued.
+    session_id = f"load-{i}"
+    samples = []
+    for turn in range(CHAT_TURNS):
+        query = {"question": f"Explain osmosis {i}, follow-up {turn}", "session_id": session_id}
+        sample = await call(app, "GET", "/chat/stream", None, query, keep=True)
+        session_id = sample.headers.get("x-session-id", session_id)
+        samples.append(sample)
+    return samples
+
+async def _learning_path_job(app, i: int) -> List["Sample"]:
+    # Submit, then follow the job's events until it finishes: one sample from submit to result,
+    # with the time to the 202 as its time to first byte.
+    submitted = await call(app, "POST", "/learning_path/jobs", _learner(i), None, keep=True)
+    if submitted.status >= 400:
+        return [submitted]
+    job_id = json.loads(submitted.body)["job_id"]
+    events = await call(app, "GET", f"/learning_path/jobs/{job_id}/events", None, None, keep=True)
+    final = [line for line in events.body.decode().splitlines() if line.startswith("event: ")][-1:]
+    status = events.status if final == ["event: succeeded"] else 500
+    return [Sample(status, submitted.latency + events.latency, submitted.latency, submitted.body_bytes + events.body_bytes)]
+
+# Routes that only make sense as a sequence of requests; a flow reports the samples it measured.
+# name -> (flow(app, i) -> samples, streamed response)
+FLOWS: Dict[str, Tuple[Callable[[Any, int], Awaitable[List["Sample"]]], bool]] = {
+    "chat_session": (_chat_session, True),
+    "learning_path_job": (_learning_path_job, True),
+}
+
+
+# ==========================================
+# 2. ASGI DRIVER
+# ==========================================
+
+@dataclass
+class Sample:
+    status: int
+    latency: float
+    ttfb: float
+    body_bytes: int
+    headers: Dict[str, str] = field(default_factory=dict)
+    body: bytes = b""
+
+
+async def call(app, method: str, path: str, body: Optional[dict], query: Optional[dict], keep: bool = False) -> Sample:
+    """One request; `keep` also returns the response headers and body, for flows that read them."""
+    raw = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": urlencode(query or {}).encode(),
+        "headers": [
+            (b"host", b"benchmark"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(raw)).encode()),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("benchmark", 80),
+    }
+
+    request_sent = False
+    response_done = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": raw, "more_body": False}
+        await response_done.wait()
+        return {"type": "http.disconnect"}
+
+    started = time.perf_counter()
+    status = 0
+    first_byte: Optional[float] = None
+    size = 0
+    headers: Dict[str, str] = {}
+    chunks: List[bytes] = []
+
+    async def send(message):
+        nonlocal status, first_byte, size
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            if keep:
+                headers.update((k.decode(), v.decode()) for k, v in message.get("headers", []))
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            if chunk and first_byte is None:
+                first_byte = time.perf_counter()
+            size += len(chunk)
+            if keep:
+                chunks.append(chunk)
+            if not message.get("more_body", False):
+                response_done.set()
+
+    await app(scope, receive, send)
+    finished = time.perf_counter()
+    return Sample(status, finished - started, (first_byte or finished) - started, size, headers, b"".join(chunks))
+
+
+# ==========================================
+# 3. RUNNER
+# ==========================================
+
+@dataclass
+class RouteReport:
+    route: str
+    requests: int
+    errors: int
+    throughput_rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    ttfb_p50_ms: Optional[float]
+    ttfb_p95_ms: Optional[float]
+    cpu_ms_per_request: float
+    peak_kb_per_inflight: Optional[float]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[rank]
+
+
+async def run_route(app, name: str, requests: int, concurrency: int, warm: bool, trace_memory: bool) -> RouteReport:
+    if name in FLOWS:
+        flow, streamed = FLOWS[name]
+    else:
+        method, path, build, streamed = ROUTES[name]
+
+        async def flow(app, i: int) -> List[Sample]:
+            body, query = build(i)
+            return [await call(app, method, path, body, query)]
+
+    limiter = asyncio.Semaphore(concurrency)
+    # Routes get disjoint inputs so one route's cached answers never serve another's.
+    offset = [*ROUTES, *FLOWS].index(name) * 1_000_000
+
+    # Warm-up request (excluded) so lazy imports and first-call setup are not measured.
+    await flow(app, offset - 1)
+
+    async def one(i: int) -> List[Sample]:
+        async with limiter:
+            return await flow(app, offset + (0 if warm else i))
+
+    if trace_memory:
+        tracemalloc.start()
+        baseline, _ = tracemalloc.get_traced_memory()
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+
+    samples = [sample for flow_samples in await asyncio.gather(*(one(i) for i in range(requests))) for sample in flow_samples]
+
+    wall = time.perf_counter() - wall_started
+    cpu = time.process_time() - cpu_started
+    peak_kb = None
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_kb = (peak - baseline) / 1024 / min(concurrency, requests)
+
+    latencies = [s.latency * 1000 for s in samples]
+    ttfbs = [s.ttfb * 1000 for s in samples]
+    return RouteReport(
+        route=name,
+        requests=len(samples),
+        errors=sum(1 for s in samples if s.status >= 400),
+        throughput_rps=len(samples) / wall,
+        p50_ms=percentile(latencies, 50),
+        p95_ms=percentile(latencies, 95),
+        p99_ms=percentile(latencies, 99),
+        ttfb_p50_ms=percentile(ttfbs, 50) if streamed else None,
+        ttfb_p95_ms=percentile(ttfbs, 95) if streamed else None,
+        cpu_ms_per_request=cpu * 1000 / len(samples),
+        peak_kb_per_inflight=peak_kb,
+    )
+
+
+def _fmt(value: Optional[float], width: int, digits: int = 1) -> str:
+    return f"{'-':>{width}}" if value is None else f"{value:>{width}.{digits}f}"
+
+
+def print_reports(reports: List[RouteReport], baseline: Dict[str, dict]) -> None:
+    header = (
+        f"{'route':<22}{'req':>5}{'err':>5}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'ttfb50':>9}{'ttfb95':>9}{'cpu ms':>8}{'kB/req':>8}"
+    )
+    if baseline:
+        header += f"{'Δp95':>9}{'Δcpu':>8}"
+    print(header)
+    for r in reports:
+        line = (
+            f"{r.route:<22}{r.requests:>5}{r.errors:>5}{_fmt(r.throughput_rps, 9)}"
+            f"{_fmt(r.p50_ms, 9)}{_fmt(r.p95_ms, 9)}{_fmt(r.p99_ms, 9)}"
+            f"{_fmt(r.ttfb_p50_ms, 9)}{_fmt(r.ttfb_p95_ms, 9)}"
+            f"{_fmt(r.cpu_ms_per_request, 8, 2)}{_fmt(r.peak_kb_per_inflight, 8)}"
+        )
+        previous = baseline.get(r.route)
+        if previous:
+            line += (
+                f"{(r.p95_ms / previous['p95_ms'] - 1) * 100:>+8.0f}%"
+                f"{(r.cpu_ms_per_request / previous['cpu_ms_per_request'] - 1) * 100:>+7.0f}%"
+            )
+        print(line)
+
+
+async def main_async(args) -> List[RouteReport]:
+    fakes.install(fakes.FakeProviderConfig(
+        ttft=args.ttft,
+        tokens_per_second=args.tokens_per_second,
+        tts_latency=args.tts_latency,
+    ))
+    # Keep benchmark audio out of the real cache directory.
+    os.environ.setdefault("TTS_CACHE_DIR", tempfile.mkdtemp(prefix="bench-tts-"))
+    os.environ.setdefault("TIMING_LOG", "0")
+
+    from main import app
+
+    names = args.routes.split(",") if args.routes else [*ROUTES, *FLOWS]
+    reports = []
+    for name in names:
+        reports.append(await run_route(app, name, args.requests, args.concurrency, args.warm, args.memory))
+        print(f"  done {name}", file=sys.stderr)
+    return reports
+
+
+def main():
+    cli = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cli.add_argument("--requests", type=int, default=100)
+    cli.add_argument("--concurrency", type=int, default=20)
+    cli.add_argument("--routes", help=f"comma separated subset of: {', '.join([*ROUTES, *FLOWS])}")
+    cli.add_argument("--warm", action="store_true", help="repeat identical inputs (exercises caches) instead of unique ones")
+    cli.add_argument("--ttft", type=float, default=0.3, help="fake provider time to first token, seconds")
+    cli.add_argument("--tokens-per-second", type=float, default=400.0)
+    cli.add_argument("--tts-latency", type=float, default=0.4, help="fake Sarvam latency per chunk, seconds")
+    cli.add_argument("--memory", action="store_true", help="trace allocations (slower, skews cpu ms)")
+    cli.add_argument("--json", help="write results to this file")
+    cli.add_argument("--compare", help="previous --json output to diff against")
+    args = cli.parse_args()
+
+    reports = asyncio.run(main_async(args))
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {r["route"]: r for r in json.load(f)["routes"]}
+    print_reports(reports, baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "routes": [asdict(r) for r in reports]}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Learning path latency with the planner and expanders run one after the
+other (PIPELINED_PLANNER=0) versus pipelined (=1), against local fake
+providers. Reports end-to-end time of create_learning_path and, for the
+/stream variant, time to the first expanded topic. Every run uses a new
+subject so no cache answers.
+
+    python -m benchmarks.pipelined_planner [--runs 20] [--concurrency 1] [--tokens-per-second 400]
+"""
+import time
+import asyncio
+import argparse
+import itertools
+import statistics
+from typing import List, Tuple
+
+from benchmarks import fakes
+
+_subjects = itertools.count()
+
+
+def _payload():
+    from Data_Templates.learning_path_templates import LearningPathInput
+    return LearningPathInput(
+        subject=f"Benchmark subject {next(_subjects)}", year_old=12, preferred_language="en", focus_areas=[]
+    )
+
+
+async def _generate() -> Tuple[float, float]:
+    import learningpath
+    started = time.perf_counter()
+    await learningpath.create_learning_path(_payload())
+    return time.perf_counter() - started, 0.0
+
+
+async def _stream() -> Tuple[float, float]:
+    import learningpath
+    started = time.perf_counter()
+    first_topic = 0.0
+    async for frame in learningpath.learning_path_event_stream(_payload()):
+        if not first_topic and '"type": "topic"' in frame:
+            first_topic = time.perf_counter() - started
+    return time.perf_counter() - started, first_topic
+
+
+async def _measure(fn, runs: int, concurrency: int) -> List[Tuple[float, float]]:
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with gate:
+            return await fn()
+
+    return await asyncio.gather(*(one() for _ in range(runs)))
+
+
+def _ms(samples: List[float], q: float) -> float:
+    return sorted(samples)[max(0, int(len(samples) * q) - 1)] * 1000
+
+
+async def main_async(args) -> None:
+    fakes.install(fakes.FakeProviderConfig(ttft=args.ttft, tokens_per_second=args.tokens_per_second))
+    import learningpath
+
+    print(f"{'mode':<12}{'route':<10}{'p50 ms':>9}{'p95 ms':>9}{'first topic p50':>17}")
+    for pipelined in (False, True):
+        learningpath.PIPELINED_PLANNER = pipelined
+        mode = "pipelined" if pipelined else "two-phase"
+        for route, fn in [("generate", _generate), ("stream", _stream)]:
+            results = await _measure(fn, args.runs, args.concurrency)
+            totals = [total for total, _ in results]
+            first = [first for _, first in results if first]
+            first_text = f"{statistics.median(first) * 1000:>17.0f}" if first else f"{'-':>17}"
+            print(f"{mode:<12}{route:<10}{_ms(totals, 0.5):>9.0f}{_ms(totals, 0.95):>9.0f}{first_text}")
+
+
+def main():
+    cli = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cli.add_argument("--runs", type=int, default=20)
+    cli.add_argument("--concurrency", type=int, default=1)
+    cli.add_argument("--ttft", type=float, default=0.3, help="fake provider time to first token, seconds")
+    cli.add_argument("--tokens-per-second", type=float, default=400.0)
+    asyncio.run(main_async(cli.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Cold-start cost of a worker: time to import `main` and the resident memory
+it leaves behind, each measured in a fresh interpreter.
+
+    python -m benchmarks.startup --runs 5
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+modules = sorted(m for m in sys.modules if m.split(".")[0] in ("langchain_cerebras", "langchain_google_genai", "sarvamai", "openai", "google"))
+print(json.dumps({
+    "import_s": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": len(sys.modules),
+    "provider_modules": len(modules),
+}))
+"""
+
+
+def probe() -> dict:
+    env = dict(os.environ, TIMING_LOG="0")
+    for key in ("CEREBRAS_API_KEY", "GOOGLE_API_KEY", "SARVAM_API_KEY"):
+        env.setdefault(key, "benchmark")
+    out = subprocess.run([sys.executable, "-c", PROBE], env=env, check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    cli = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cli.add_argument("--runs", type=int, default=5)
+    args = cli.parse_args()
+
+    probe()  # warm the filesystem and bytecode caches
+    samples = [probe() for _ in range(args.runs)]
+    print(f"import main     median {statistics.median(s['import_s'] for s in samples) * 1000:8.1f} ms")
+    print(f"max rss         median {statistics.median(s['max_rss_mb'] for s in samples):8.1f} MB")
+    print(f"modules loaded         {samples[-1]['modules']:8d}")
+    print(f"provider modules       {samples[-1]['provider_modules']:8d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Prompt size and prompt-building cost per endpoint for the three ways of
+asking for structured output:
+
+    full    PydanticOutputParser.get_format_instructions() in the prompt (previous behaviour)
+    hint    compact schema hint in the prompt (fallback mode)
+    native  provider JSON-schema mode; the schema travels in response_format
+
+Token counts use tiktoken's cl100k_base when its encoding file is available
+locally, otherwise an estimate of 4 characters per token. Neither is the
+Qwen or Gemini tokenizer, so compare ratios rather than absolute counts.
+
+    python -m benchmarks.structured_output
+"""
+import json
+import time
+from typing import Callable, Dict, List, Tuple, Type
+
+from pydantic import BaseModel
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.prompts import PromptTemplate
+
+from Core.structured_output import NATIVE_INSTRUCTIONS, schema_hint
+
+
+def _token_counter() -> Tuple[str, Callable[[str], int]]:
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return "cl100k", lambda text: len(encoding.encode(text))
+    except Exception:
+        return "~4ch", lambda text: (len(text) + 3) // 4
+
+
+def _endpoints() -> Dict[str, Tuple[PromptTemplate, Type[BaseModel], dict]]:
+    import learningpath
+    import test_analysis
+    import quiz_evaluation
+    from testGenerator import generate_test
+    from Data_Templates.learning_path_templates import Topic, TopicList
+    from Data_Templates.test_generation_templates import TestGenOutput
+    from benchmarks.load_test import _results
+
+    results = test_analysis.TestAnalysisInput(topic="Cells", language="en", results=_results(0))
+    learner = {"subject": "Photosynthesis", "year_old": 12, "preferred_language": "en", "focus_areas": ""}
+    return {
+        "topic_planner": (learningpath.topic_planner_prompt, TopicList, learner),
+        "topic_expander": (learningpath.topic_expander_prompt, Topic, {**learner, "topic_name": "Light"}),
+        "test_generation": (generate_test.prompt, TestGenOutput,
+                            {"topic": "Cells", "difficulty": "easy", "num_questions": 10, "language": "en"}),
+        "quiz_evaluation": (quiz_evaluation.prompt, quiz_evaluation.QuizEvaluation,
+                            {"topic": "Cells", "language": "en",
+                             "attempt": quiz_evaluation.format_attempt(test_analysis.to_attempt(results))}),
+    }
+
+
+def _per_call_us(fn: Callable[[], object], repeat: int = 300) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    unit, count = _token_counter()
+    rows: List[str] = []
+    for name, (prompt, output_model, inputs) in _endpoints().items():
+        full = prompt.format(**inputs, format_instructions=PydanticOutputParser(pydantic_object=output_model).get_format_instructions())
+        hint = prompt.format(**inputs, format_instructions=schema_hint(output_model))
+        native = prompt.format(**inputs, format_instructions=NATIVE_INSTRUCTIONS)
+        schema = json.dumps(output_model.model_json_schema())
+
+        # Per-request cost of building parser + template + formatting (previously done on
+        # every request in test_analysis / quiz_feedback) vs formatting a prebuilt template.
+        def rebuild():
+            parser = PydanticOutputParser(pydantic_object=output_model)
+            template = PromptTemplate(
+                template=prompt.template,
+                input_variables=[v for v in prompt.input_variables if v != "format_instructions"],
+                partial_variables={**prompt.partial_variables, "format_instructions": parser.get_format_instructions()},
+            )
+            return template.format(**inputs)
+
+        prebuilt = prompt.partial(format_instructions=schema_hint(output_model))
+        rows.append(
+            f"{name:<17}{count(full):>8}{count(hint):>8}{count(native):>8}{count(schema):>9}"
+            f"{(1 - count(hint) / count(full)) * 100:>8.0f}%"
+            f"{_per_call_us(rebuild):>11.0f}{_per_call_us(lambda: prebuilt.format(**inputs)):>11.0f}"
+        )
+
+    print(f"prompt tokens ({unit}); µs = prompt construction per request")
+    print(f"{'endpoint':<17}{'full':>8}{'hint':>8}{'native':>8}{'+schema':>9}{'saved':>9}{'rebuild µs':>11}{'prebuilt':>11}")
+    print("\n".join(rows))
+
+
+if __name__ == "__main__":
+    main()
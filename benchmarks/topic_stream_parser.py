@@ -0,0 +1,91 @@
+"""
+CPU cost of parsing one streamed topic-detail response.
+
+Compares the previous JsonOutputParser approach (re-parse the accumulated
+partial JSON on every token, then diff the explanation by length) with the
+incremental push parser used by topic_detail_event_stream.
+
+    python -m benchmarks.topic_stream_parser [--token-chars 4] [--repeat 3]
+"""
+import json
+import time
+import argparse
+
+from langchain_core.messages import AIMessageChunk
+from langchain_core.output_parsers import JsonOutputParser
+
+from Core.incremental_json import IncrementalJsonParser
+
+
+def build_tokens(explanation_chars: int, token_chars: int) -> list[str]:
+    sentence = "Plants use sunlight, water and carbon dioxide to make glucose. "
+    topic = {
+        "topic_name": "Photosynthesis",
+        "explanation": (sentence * (explanation_chars // len(sentence) + 1))[:explanation_chars],
+        "practice_questions": [
+            {
+                "question": f"Practice question number {i} about photosynthesis?",
+                "options": ["Sunlight", "Water", "Oxygen", "Soil"],
+                "correct_index": i % 4,
+            }
+            for i in range(5)
+        ],
+    }
+    text = json.dumps(topic, ensure_ascii=False)
+    return [text[i:i + token_chars] for i in range(0, len(text), token_chars)]
+
+
+def run_reparse(tokens: list[str]) -> int:
+    parser = JsonOutputParser()
+    events = 0
+    last_sent_length = 0
+    final_data = {}
+    for chunk in parser.transform(AIMessageChunk(content=t) for t in tokens):
+        final_data = chunk
+        current_text = chunk.get("explanation") or ""
+        if len(current_text) > last_sent_length:
+            last_sent_length = len(current_text)
+            events += 1
+    return events + len(final_data.get("practice_questions", []))
+
+
+def run_incremental(tokens: list[str]) -> int:
+    parser = IncrementalJsonParser(
+        stream_strings=[("explanation",)],
+        emit_items=[("practice_questions", "*")],
+    )
+    events = 0
+    for token in tokens:
+        events += len(parser.feed(token))
+    parser.close()
+    return events
+
+
+def measure(fn, tokens: list[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.process_time()
+        fn(tokens)
+        best = min(best, time.process_time() - started)
+    return best
+
+
+def main():
+    cli = argparse.ArgumentParser(description=__doc__)
+    cli.add_argument("--token-chars", type=int, default=4)
+    cli.add_argument("--repeat", type=int, default=3)
+    args = cli.parse_args()
+
+    print(f"{'explanation':>12} {'tokens':>7} {'reparse ms':>11} {'incremental ms':>15} {'speedup':>8}")
+    for explanation_chars in (1000, 4000, 8000, 16000):
+        tokens = build_tokens(explanation_chars, args.token_chars)
+        reparse = measure(run_reparse, tokens, args.repeat)
+        incremental = measure(run_incremental, tokens, args.repeat)
+        print(
+            f"{explanation_chars:>12} {len(tokens):>7} {reparse * 1000:>11.1f} "
+            f"{incremental * 1000:>15.2f} {reparse / incremental:>7.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import os
+import asyncio
+from typing import Annotated, List, Optional
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from Data_Templates.test_generation_templates import Question
+from test_analysis import analyze_test_service, QuestionResult, TestAnalysisInput, TestAnalysisOutput
+from Core.scheduler import priority, BULK
+
+SKIPPED = -1
+# Answer key entry for a question whose correct_index names none of its options;
+# no selection can equal it, so nobody scores that question.
+NO_KEY = -2
+# Any choice past a question's last option is read as a skip; the bound only
+# keeps submitted values inside the int64 selection matrix.
+MAX_OPTION_INDEX = 255
+
+MAX_CONCURRENT_ANALYSES = int(os.getenv("CLASS_ANALYSIS_CONCURRENCY", "8"))
+# Most error patterns analyzed per class. Past it, students are grouped with the pattern whose
+# missed questions are closest to theirs (0 = one analysis per distinct set of missed questions).
+MAX_ERROR_PATTERNS = int(os.getenv("CLASS_ANALYSIS_MAX_PATTERNS", "16"))
+
+# ==========================================
+# 1. DATA MODELS
+# ==========================================
+
+class StudentSubmission(BaseModel):
+    student_id: str
+    selected_indices: List[Annotated[int, Field(ge=SKIPPED, le=MAX_OPTION_INDEX)]] = Field(
+        description="Selected option per question, -1 if skipped"
+    )
+
+class ClassAnalysisInput(BaseModel):
+    topic: str
+    language: str
+    questions: List[Question] = Field(min_length=1)
+    submissions: List[StudentSubmission]
+
+class QuestionStats(BaseModel):
+    question_index: int
+    correct_rate: float
+    skip_rate: float
+    option_counts: List[int] = Field(description="How many students picked each option")
+    top_distractor: Optional[int] = Field(default=None, description="Most picked wrong option, if any")
+
+class StudentResult(BaseModel):
+    student_id: str
+    score: int
+    total: int
+    analysis: TestAnalysisOutput
+
+class ClassSummary(BaseModel):
+    num_students: int
+    num_questions: int
+    mean_score: float
+    median_score: float
+    distinct_error_patterns: int = Field(
+        description="Error patterns analyzed; students who missed the same or similar questions share one analysis"
+    )
+    questions: List[QuestionStats]
+
+class ClassAnalysisOutput(BaseModel):
+    students: List[StudentResult]
+    summary: ClassSummary
+
+
+# ==========================================
+# 2. LOCAL SCORING
+# ==========================================
+
+def selection_matrix(payload: ClassAnalysisInput) -> np.ndarray:
+    """Students x questions matrix of selected option indices, SKIPPED for no/invalid answer."""
+    num_questions = len(payload.questions)
+    selections = np.full((len(payload.submissions), num_questions), SKIPPED, dtype=np.int64)
+    for row, submission in enumerate(payload.submissions):
+        answers = submission.selected_indices[:num_questions]
+        selections[row, :len(answers)] = answers
+
+    num_options = np.array([len(q.options) for q in payload.questions])
+    selections[(selections < 0) | (selections >= num_options)] = SKIPPED
+    return selections
+
+def answer_key(payload: ClassAnalysisInput) -> np.ndarray:
+    """Correct option per question, NO_KEY where correct_index is out of range."""
+    return np.array(
+        [q.correct_index if 0 <= q.correct_index < len(q.options) else NO_KEY for q in payload.questions],
+        dtype=np.int64,
+    )
+
+def question_stats(payload: ClassAnalysisInput, selections: np.ndarray, correct: np.ndarray) -> List[QuestionStats]:
+    num_students, num_questions = selections.shape
+    width = max((len(q.options) for q in payload.questions), default=0)
+
+    # One bincount over flattened (question, option) cells gives every distractor frequency.
+    answered = selections != SKIPPED
+    cells = (np.nonzero(answered)[1] * width) + selections[answered]
+    option_counts = np.bincount(cells, minlength=num_questions * width).reshape(num_questions, width)
+
+    correct_rate = correct.mean(axis=0) if num_students else np.zeros(num_questions)
+    skip_rate = (~answered).mean(axis=0) if num_students else np.zeros(num_questions)
+
+    wrong_counts = option_counts.copy()
+    key = answer_key(payload)
+    in_range = (key >= 0) & (key < width)
+    wrong_counts[np.arange(num_questions)[in_range], key[in_range]] = 0
+    top_distractor = wrong_counts.argmax(axis=1)
+
+    return [
+        QuestionStats(
+            question_index=i,
+            correct_rate=float(correct_rate[i]),
+            skip_rate=float(skip_rate[i]),
+            option_counts=option_counts[i, :len(q.options)].tolist(),
+            top_distractor=int(top_distractor[i]) if wrong_counts[i].any() else None,
+        )
+        for i, q in enumerate(payload.questions)
+    ]
+
+
+# ==========================================
+# 3. SERVICE FUNCTION
+# ==========================================
+
+def pattern_input(payload: ClassAnalysisInput, answers: np.ndarray) -> TestAnalysisInput:
+    return TestAnalysisInput(
+        topic=payload.topic,
+        language=payload.language,
+        results=[
+            QuestionResult(
+                question=q.question,
+                selected_option_index=int(answers[i]),
+                correct_option_index=q.correct_index,
+                options=q.options,
+            )
+            for i, q in enumerate(payload.questions)
+        ],
+    )
+
+def error_patterns(missed: np.ndarray, limit: int = MAX_ERROR_PATTERNS) -> np.ndarray:
+    """
+    Pattern index per student from the students x questions `missed` matrix.
+    Identical missed sets always share a pattern; if there are more than
+    `limit` of them, students are clustered on Hamming distance (k-modes,
+    seeded with the most common set and then the farthest from those chosen).
+    """
+    unique_sets, first, inverse, counts = np.unique(
+        missed, axis=0, return_index=True, return_inverse=True, return_counts=True
+    )
+    inverse = inverse.reshape(-1)
+    if not limit or len(unique_sets) <= limit:
+        return inverse
+
+    points = missed.astype(np.int32)
+    centers = [points[first[counts.argmax()]]]
+    while len(centers) < limit:
+        distance = np.min([np.abs(points - c).sum(axis=1) for c in centers], axis=0)
+        centers.append(points[distance.argmax()])
+    centers = np.array(centers)
+
+    labels = None
+    for _ in range(10):
+        # Hamming distance of every student to every center, without a students x centers x questions array.
+        distance = points @ (1 - centers).T + (1 - points) @ centers.T
+        new_labels = distance.argmin(axis=1)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for k in range(len(centers)):
+            members = points[labels == k]
+            if len(members):
+                centers[k] = members.mean(axis=0) >= 0.5
+    # Renumber so empty clusters leave no gaps.
+    return np.unique(labels, return_inverse=True)[1].reshape(-1)
+
+def pattern_answers(selections: np.ndarray, missed: np.ndarray, key: np.ndarray, members: np.ndarray) -> np.ndarray:
+    """
+    The answer sheet analyzed for one error pattern: a question counts as
+    missed when most of its students missed it, with the choice (or skip) most
+    of those students made; otherwise the correct option.
+    """
+    answers = key.copy()
+    for q in np.nonzero(missed[members].mean(axis=0) >= 0.5)[0]:
+        choices, counts = np.unique(selections[members[missed[members, q]], q], return_counts=True)
+        answers[q] = choices[counts.argmax()]
+    return answers
+
+async def analyze_class_service(payload: ClassAnalysisInput) -> ClassAnalysisOutput:
+    selections = selection_matrix(payload)
+    key = answer_key(payload)
+    correct = selections == key
+    scores = correct.sum(axis=1)
+
+    # Students who missed the same (or, past MAX_ERROR_PATTERNS, similar) questions share one analysis:
+    # one LLM call per error pattern, made on the pattern's answers rather than any one student's sheet.
+    missed = ~correct
+    pattern_of = error_patterns(missed)
+    num_patterns = int(pattern_of.max()) + 1 if len(pattern_of) else 0
+
+    limiter = asyncio.Semaphore(MAX_CONCURRENT_ANALYSES)
+
+    async def analyze(pattern: int) -> TestAnalysisOutput:
+        answers = pattern_answers(selections, missed, key, np.nonzero(pattern_of == pattern)[0])
+        async with limiter:
+            return await analyze_test_service(pattern_input(payload, answers))
+
+    with priority(BULK):
+        analyses = await asyncio.gather(*(analyze(pattern) for pattern in range(num_patterns)))
+
+    students = [
+        StudentResult(
+            student_id=submission.student_id,
+            score=int(scores[row]),
+            total=len(payload.questions),
+            analysis=analyses[pattern_of[row]],
+        )
+        for row, submission in enumerate(payload.submissions)
+    ]
+
+    summary = ClassSummary(
+        num_students=len(payload.submissions),
+        num_questions=len(payload.questions),
+        mean_score=float(scores.mean()) if len(scores) else 0.0,
+        median_score=float(np.median(scores)) if len(scores) else 0.0,
+        distinct_error_patterns=num_patterns,
+        questions=question_stats(payload, selections, correct),
+    )
+    return ClassAnalysisOutput(students=students, summary=summary)
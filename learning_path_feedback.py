@@ -1,15 +1,6 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_cerebras import ChatCerebras
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
 from typing import List, Optional, Union
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# Initialize the ChatCerebras model
-llm = ChatCerebras(model="qwen-3-235b-a22b-instruct-2507")
+from quiz_evaluation import AttemptAnswer, QuizAttempt, evaluate_quiz
 
 
 class QuestionItem(BaseModel):
@@ -23,6 +14,8 @@ class QuizFeedbackInput(BaseModel):
     questions: List[QuestionItem]
     correct_questions: List[QuestionItem]
     incorrect_questions: List[QuestionItem]
+    # Pass the same language as /test/analyze so both share one evaluation.
+    language: str = "en"
 
 
 # ==========================================
@@ -39,74 +32,44 @@ class QuizFeedbackOutput(BaseModel):
 
 
 
-def generate_quiz_feedback(payload: QuizFeedbackInput) -> dict:
+def to_attempt(payload: QuizFeedbackInput) -> QuizAttempt:
+    # Answers missing on `questions` are taken from the correct/incorrect lists.
+    selected = {item.question: item.correct_index for item in payload.correct_questions}
+    selected.update(
+        (item.question, item.selected_index) for item in payload.incorrect_questions if item.selected_index is not None
+    )
+    items = payload.questions or payload.correct_questions + payload.incorrect_questions
+    return QuizAttempt(
+        topic=payload.topic,
+        language=payload.language,
+        answers=[
+            AttemptAnswer(
+                question=item.question,
+                options=item.options,
+                correct_index=item.correct_index,
+                selected_index=item.selected_index if item.selected_index is not None else selected.get(item.question),
+            )
+            for item in items
+        ],
+    )
+
+
+async def generate_quiz_feedback(payload: QuizFeedbackInput) -> dict:
     """
     Generates structured feedback based on quiz performance.
     Accepts a validated Pydantic model as input.
     """
-    
-    
-    parser = PydanticOutputParser(pydantic_object=QuizFeedbackOutput)
-    
-  
-    def format_questions(q_list: List[QuestionItem]):
-        if not q_list:
-            return "None"
-        
-        formatted_text = ""
-        for item in q_list:
-            formatted_text += f"- Question: {item.question}\n"
-        
-            if item.selected_index is not None and item.selected_index != item.correct_index:
-                wrong_answer = item.options[item.selected_index]
-                formatted_text += f"  (User incorrectly chose: {wrong_answer})\n"
-                
-        return formatted_text
-
-    questions_str = format_questions(payload.questions)
-    correct_str = format_questions(payload.correct_questions)
-    incorrect_str = format_questions(payload.incorrect_questions)
-
-    prompt = PromptTemplate(
-        template="""
-You are an expert learning mentor. 
-Analyze the user's quiz attempt on the topic: "{topic}" and generate structured feedback.
-
-DATA:
----
-ALL QUESTIONS:
-{questions}
-
-CORRECTLY ANSWERED:
-{correct_questions}
-
-INCORRECTLY ANSWERED:
-{incorrect_questions}
----
-
-INSTRUCTIONS:
-1. Analyze the "INCORRECTLY ANSWERED" section to identify specific gaps in knowledge.
-2. Analyze the "CORRECTLY ANSWERED" section to identify concepts they have mastered.
-3. Provide specific "Suggestions" on what to study next based on the errors.
-4. Output MUST be valid JSON matching the schema below.
-
-{format_instructions}
-""",
-        input_variables=["topic", "questions", "correct_questions", "incorrect_questions"],
-        partial_variables={"format_instructions": parser.get_format_instructions()}
-    )
-
-    chain = prompt | llm | parser
-    
     try:
-        result = chain.invoke({
-            "topic": payload.topic,
-            "questions": questions_str,
-            "correct_questions": correct_str,
-            "incorrect_questions": incorrect_str
-        })
-        
-        return result.model_dump()
+        # Shares the cached evaluation with /test/analyze for the same attempt.
+        evaluation = await evaluate_quiz(to_attempt(payload))
+        return QuizFeedbackOutput(
+            topic=payload.topic,
+            understanding_level=evaluation.understanding_level,
+            strengths=evaluation.strengths,
+            weaknesses=evaluation.weaknesses,
+            suggestions=evaluation.suggestions,
+            feedback=evaluation.feedback,
+        ).model_dump()
         
     except Exception as e:
         print(f"Error generating feedback: {e}")
@@ -1,20 +1,33 @@
 
+import os
 import json
-from langchain_cerebras import ChatCerebras
-from langchain_google_genai import ChatGoogleGenerativeAI
-from dotenv import load_dotenv
+import time
+import asyncio
+from typing import AsyncIterator, Optional
+from pydantic import ValidationError
+from langchain_core.exceptions import OutputParserException
 from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import PydanticOutputParser,JsonOutputParser
 from Data_Templates.learning_path_templates import LearningPathInput,Topic,LearningPathOutPut,TopicList,TopicDetail
-
-load_dotenv()
-
-
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash-lite")
-
-
-topic_parser = PydanticOutputParser(pydantic_object=Topic)
-topic_list_parser = PydanticOutputParser(pydantic_object=TopicList)
+from Core.response_cache import cached_chain, canonical_key
+from Core.singleflight import singleflight
+from Core.metrics import instrument
+from Core.incremental_json import IncrementalJsonParser
+from Core.model_registry import model_registry, QWEN, GEMINI_FLASH_LITE
+from Core.hedging import hedged
+from Core.structured_output import schema_hint, structured_chain
+from Core.jobs import Job, JobQueue, Progress
+from Core.scheduler import llm_priority, priority, BULK, INTERACTIVE
+from Core.prefetch import Prefetcher
+from Core.content_library import content_library
+
+# Bump when a prompt template changes so stale cached answers are not served.
+PLANNER_PROMPT_VERSION = "v2"
+EXPANDER_PROMPT_VERSION = "v2"
+
+# Stream the planner and start expanding each topic as soon as its name is complete.
+PIPELINED_PLANNER = os.getenv("PIPELINED_PLANNER", "1") == "1"
+# Topics expanded in the background once a topic list is returned (0 = off).
+TOPIC_PREFETCH_COUNT = int(os.getenv("TOPIC_PREFETCH_COUNT", "0"))
 
 topic_planner_prompt = PromptTemplate(
     template="""
@@ -42,24 +55,17 @@ Strict rules:
 - Do NOT add extra fields or text.
 
 Output rules:
-- You must generate a JSON object that is an INSTANCE of the schema.
-- Do NOT return the schema or its definitions.
-- Do NOT include "properties", "required", or any field descriptions.
 - Populate the "topics" field with actual topic names.
-- Return ONLY the final JSON object.
-
 
 {format_instructions}
 """,
-    input_variables=["subject", "year_old", "preferred_language", "focus_areas"],
-    partial_variables={
-        "format_instructions": topic_list_parser.get_format_instructions()
-    },
+    input_variables=["subject", "year_old", "preferred_language", "focus_areas", "format_instructions"],
 )
 
-from langchain_core.prompts import PromptTemplate
-model = ChatCerebras(model="qwen-3-235b-a22b-instruct-2507")
-model2 = ChatCerebras(model="qwen-3-235b-a22b-instruct-2507",streaming=True)
+model = model_registry.chat_model("cerebras", QWEN)
+model2 = model_registry.chat_model("cerebras", QWEN, streaming=True)
+# Fallback for hedged chains; streaming so its first token can be observed too.
+gemini = model_registry.chat_model("google", GEMINI_FLASH_LITE, streaming=True)
 topic_expander_prompt = PromptTemplate(
     template="""
 You are an expert tutor.
@@ -87,12 +93,7 @@ Strict rules:
   - hi → Hindi
   - mr → Marathi
 Output rules:
-- You must generate a JSON object that is an INSTANCE of the schema.
-- Do NOT return the schema or its definitions.
-- Do NOT include "$defs", "properties", or "required".
 - Populate all required fields with actual values.
-- Return only valid JSON.
-
 
 {format_instructions}
 """,
@@ -101,91 +102,335 @@ Output rules:
         "year_old",
         "preferred_language",
         "topic_name",
+        "format_instructions",
     ],
-    partial_variables={
-        "format_instructions": topic_parser.get_format_instructions()
-    },
 )
 
+# What the prompts ask for; a truncated answer with less is regenerated, never cached or stored.
+MIN_PLANNED_TOPICS = 6
+PRACTICE_QUESTIONS = 5
+
+def complete_plan(inputs: dict, topic_list: TopicList) -> bool:
+    return len(topic_list.topics) >= MIN_PLANNED_TOPICS
+
+def complete_topic(inputs: dict, topic: Topic) -> bool:
+    return len(topic.practice_questions or []) >= PRACTICE_QUESTIONS
+
+topic_planner_chain = cached_chain(
+    hedged(
+        "topic_planner",
+        [
+            ("cerebras", instrument(structured_chain(topic_planner_prompt, TopicList, model2, complete=complete_plan), "topic_planner")),
+            ("google", instrument(structured_chain(topic_planner_prompt, TopicList, gemini, complete=complete_plan), "topic_planner")),
+        ],
+        validate=lambda topic_list: bool(topic_list.topics),
+    ),
+    namespace="topic_planner",
+    model_name=model.model_name,
+    prompt_version=PLANNER_PROMPT_VERSION,
+    output_model=TopicList,
+)
+# Parsed incrementally from raw text, so the schema goes into the prompt.
+topic_planner_stream_chain = instrument(
+    topic_planner_prompt.partial(format_instructions=schema_hint(TopicList)) | model2, "topic_planner_stream"
+)
+topic_expander_chain = instrument(
+    topic_expander_prompt.partial(format_instructions=schema_hint(Topic)) | model2, "topic_expander_stream"
+)
+topic_expander_parser_chain = cached_chain(
+    instrument(structured_chain(topic_expander_prompt, Topic, model, complete=complete_topic), "topic_expander"),
+    namespace="topic_expander",
+    model_name=model.model_name,
+    prompt_version=EXPANDER_PROMPT_VERSION,
+    output_model=Topic,
+)
 
-topic_planner_chain = topic_planner_prompt | model | topic_list_parser
-topic_expander_chain = topic_expander_prompt | model2 
-topic_expander_parser_chain = topic_expander_prompt | model | topic_parser
+def expander_input(payload:LearningPathInput, topic_name:str) -> dict:
+    return {
+        "subject": payload.subject,
+        "year_old": payload.year_old,
+        "preferred_language": payload.preferred_language,
+        "topic_name": topic_name,
+    }
 
-def create_learning_path(payload:LearningPathInput)->LearningPathOutPut:
-    result = topic_planner_chain.invoke(
-        payload.model_dump()
+async def library_topic(payload:LearningPathInput, topic_name:str) -> Optional[Topic]:
+    """A stored expansion of a near-identical topic for the same language and age band, if any."""
+    if content_library is None:
+        return None
+    match = await asyncio.to_thread(
+        content_library.lookup, payload.subject, topic_name, payload.preferred_language, payload.year_old
     )
-
-    topic_expander = topic_expander_parser_chain.batch([
-        {
-            "subject": payload.subject,
-            "year_old": payload.year_old,
-            "preferred_language": payload.preferred_language,
-            "topic_name": topic,
-        }
-        for topic in result.topics
-    ])
-
-    topics_detailed: list[Topic] = topic_expander
+    if match is None:
+        return None
+    return Topic.model_validate_json(match.content).model_copy(update={"topic_name": topic_name})
+
+async def store_topic(payload:LearningPathInput, topic_name:str, topic:Topic) -> None:
+    if content_library is not None:
+        await asyncio.to_thread(
+            content_library.store,
+            payload.subject, topic_name, payload.preferred_language, payload.year_old, topic.model_dump_json(),
+        )
+
+async def expand_topic(payload:LearningPathInput, topic_name:str) -> Topic:
+    topic = await library_topic(payload, topic_name)
+    if topic is None:
+        topic = await topic_expander_parser_chain.ainvoke(expander_input(payload, topic_name))
+        await store_topic(payload, topic_name, topic)
+    return topic
+
+async def planned_topics(payload:LearningPathInput) -> AsyncIterator[str]:
+    """
+    Topic names planned for `payload`, each yielded as soon as the planner has
+    written it. Cached plans are replayed. A planner stream that fails before
+    its first topic falls back to the hedged topic_planner_chain; one that
+    fails, or does not end in a valid TopicList, after topics were sent
+    raises, since a second plan would not fit the topics already handed out.
+    """
+    inputs = payload.model_dump()
+    if not PIPELINED_PLANNER:
+        for topic_name in (await topic_planner_chain.ainvoke(inputs)).topics:
+            yield topic_name
+        return
+
+    on_disk = topic_planner_chain.cache.disk_path is not None
+    stream_key = canonical_key("topic_planner_stream", model2.model_name, PLANNER_PROMPT_VERSION, inputs)
+    if not topic_planner_chain.joins_in_flight(stream_key):
+        cached = await asyncio.to_thread(topic_planner_chain.lookup, inputs) if on_disk else topic_planner_chain.lookup(inputs)
+        if cached is not None:
+            for topic_name in cached.topics:
+                yield topic_name
+            return
+
+    parser = IncrementalJsonParser(emit_items=[("topics", "*")])
+
+    async def token_stream():
+        async for chunk in topic_planner_stream_chain.astream(inputs):
+            yield chunk.content
+
+    sent = []
+    error: Optional[Exception] = None
+    started = time.perf_counter()
+    try:
+        # Identical concurrent requests share one upstream token stream.
+        async for token in singleflight.stream(stream_key, token_stream):
+            for _kind, _path, topic_name in parser.feed(token):
+                if isinstance(topic_name, str) and topic_name.strip():
+                    sent.append(topic_name)
+                    yield topic_name
+    except Exception as e:
+        error = e
+
+    topic_list = None
+    if error is None and parser.done:
+        try:
+            topic_list = TopicList.model_validate(parser.result)
+        except ValidationError:
+            topic_list = None
+    if topic_list is not None and topic_list.topics == sent:
+        cost = time.perf_counter() - started
+        if on_disk:
+            await asyncio.to_thread(topic_planner_chain.store, inputs, topic_list, cost)
+        else:
+            topic_planner_chain.store(inputs, topic_list, cost)
+        return
+
+    if sent:
+        raise error or OutputParserException("Topic planner stream did not end in a valid topic list")
+    print(f"Topic planner stream produced no topics, falling back: {error or 'invalid topic list'}")
+    # Already missed the cache above; skip the second lookup.
+    for topic_name in (await topic_planner_chain.acompute(inputs)).topics:
+        yield topic_name
+
+async def create_learning_path(payload:LearningPathInput, report: Optional[Progress] = None)->LearningPathOutPut:
+    expanded = 0
+
+    async def expand(topic_name: str) -> Topic:
+        nonlocal expanded
+        topic = await expand_topic(payload, topic_name)
+        expanded += 1
+        if report:
+            report(topics_expanded=expanded)
+        return topic
+
+    # Each expansion starts while the planner is still writing the next topic.
+    tasks = []
+    try:
+        async for topic_name in planned_topics(payload):
+            with priority(BULK):
+                tasks.append(asyncio.create_task(expand(topic_name)))
+            if report:
+                report(topics_planned=len(tasks), topics_expanded=expanded)
+        topics_detailed: list[Topic] = await asyncio.gather(*tasks)
+    finally:
+        # Planner or an expansion failed: stop paying for the other expansions.
+        for task in tasks:
+            task.cancel()
     learning_path = LearningPathOutPut(
         topics=topics_detailed,
         additional_resources=None,
     )
     return learning_path
 
-def create_topic_list(payload:LearningPathInput) -> TopicList:
-    topic_list = topic_planner_chain.invoke(payload.model_dump())
+learning_path_jobs = JobQueue("learning_path")
+
+def submit_learning_path(payload:LearningPathInput) -> Job:
+    """Queues create_learning_path; identical payloads share one job while its result is retained."""
+    key = canonical_key(
+        "learning_path_job", model.model_name, f"{PLANNER_PROMPT_VERSION}/{EXPANDER_PROMPT_VERSION}", payload.model_dump()
+    )
+
+    async def run(report: Progress) -> LearningPathOutPut:
+        with priority(BULK):
+            return await create_learning_path(payload, report)
+
+    return learning_path_jobs.submit(key, run)
+
+topic_prefetch = Prefetcher(
+    ttl=float(os.getenv("TOPIC_PREFETCH_TTL_SECONDS", "1800")),
+    max_entries=int(os.getenv("TOPIC_PREFETCH_MAX_ENTRIES", "500")),
+) if TOPIC_PREFETCH_COUNT > 0 else None
+
+def prefetch_topics(payload:LearningPathInput, topic_list:TopicList) -> None:
+    # Learners usually open the first topics first.
+    for topic_name in topic_list.topics[:TOPIC_PREFETCH_COUNT]:
+        input_data = expander_input(payload, topic_name)
+        topic_prefetch.schedule(
+            topic_expander_parser_chain.cache_key(input_data),
+            lambda topic_name=topic_name: expand_topic(payload, topic_name),
+        )
+
+async def prefetched_topic(payload:TopicDetail) -> Optional[Topic]:
+    if topic_prefetch is None:
+        return None
+    input_data = expander_input(payload.payload, payload.topic_name)
+    return await topic_prefetch.take(topic_expander_parser_chain.cache_key(input_data))
+
+async def create_topic_list(payload:LearningPathInput) -> TopicList:
+    topic_list = await topic_planner_chain.ainvoke(payload.model_dump())
+    if topic_prefetch is not None:
+        prefetch_topics(payload, topic_list)
     return topic_list
 
-def create_topic_detail(payload:TopicDetail) -> Topic:
-    topic_detail = topic_expander_parser_chain.invoke(
-        {
-            "subject": payload.payload.subject,
-            "year_old": payload.payload.year_old,
-            "preferred_language": payload.payload.preferred_language,
-            "topic_name": payload.topic_name,
-        }
+async def create_topic_detail(payload:TopicDetail) -> Topic:
+    topic_detail = await prefetched_topic(payload)
+    if topic_detail is not None:
+        return topic_detail
+    return await expand_topic(payload.payload, payload.topic_name)
+
+async def topic_detail_event_stream(payload: TopicDetail):
+    # Push parser: explanation text is forwarded as it arrives and each
+    # practice question is sent the moment its JSON object closes.
+    parser = IncrementalJsonParser(
+        stream_strings=[("explanation",)],
+        emit_items=[("practice_questions", "*")],
     )
-    return topic_detail
-def topic_detail_event_stream(payload: TopicDetail):
-    parser = JsonOutputParser(pydantic_object=Topic)
-    streaming_chain = topic_expander_prompt | model2 | parser
-
-    input_data = {
-        "subject": payload.payload.subject,
-        "year_old": payload.payload.year_old,
-        "preferred_language": payload.payload.preferred_language,
-        "topic_name": payload.topic_name,
-    }
 
-    last_sent_length = 0
-    final_data = {} 
+    # Set rather than scoped: the generator runs in the response's own task.
+    llm_priority.set(INTERACTIVE)
+    input_data = expander_input(payload.payload, payload.topic_name)
+    stream_key = canonical_key("topic_expander_stream", model2.model_name, EXPANDER_PROMPT_VERSION, input_data)
 
-    try:
-        for chunk in streaming_chain.stream(input_data):
-            final_data = chunk 
-            
-            if "explanation" in chunk and chunk["explanation"]:
-                current_text = chunk["explanation"]
-                
-                if len(current_text) > last_sent_length:
-                    new_content = current_text[last_sent_length:]
-                    last_sent_length = len(current_text)
-                    
-                    yield f"data: {json.dumps({
-                        'type': 'explanation_chunk', 
-                        'data': new_content
-                    })}\n\n"
-
-        if "practice_questions" in final_data:
-             for q in final_data["practice_questions"]:
-                yield f"data: {json.dumps({
-                    'type': 'question', 
-                    'data': q
-                })}\n\n"
+    async def token_stream():
+        async for chunk in topic_expander_chain.astream(input_data):
+            yield chunk.content
 
+    try:
+        prefetched = await prefetched_topic(payload) or await library_topic(payload.payload, payload.topic_name)
+        if prefetched is not None:
+            # Replay the prefetched or stored topic in the same event shapes as a live stream.
+            yield f"data: {json.dumps({'type': 'explanation_chunk', 'data': prefetched.explanation})}\n\n"
+            for question in prefetched.practice_questions or []:
+                yield f"data: {json.dumps({'type': 'question', 'data': question.model_dump()})}\n\n"
+            yield f"data: {json.dumps({'type': 'done'})}\n\n"
+            return
+
+        # Identical concurrent requests share one upstream token stream.
+        async for token in singleflight.stream(stream_key, token_stream):
+            for kind, _path, value in parser.feed(token):
+                if kind == "delta":
+                    event = {'type': 'explanation_chunk', 'data': value}
+                else:
+                    event = {'type': 'question', 'data': value}
+                yield f"data: {json.dumps(event)}\n\n"
+
+        if parser.done:
+            try:
+                streamed = Topic.model_validate(parser.result)
+            except ValidationError:
+                streamed = None
+            if streamed is not None:
+                await store_topic(payload.payload, payload.topic_name, streamed)
         yield f"data: {json.dumps({'type': 'done'})}\n\n"
 
     except Exception as e:
         yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+
+
+async def learning_path_event_stream(payload: LearningPathInput):
+    """
+    Progressive variant of create_learning_path.
+    Sends each topic name as soon as the planner has written it (with its
+    index), then the complete topic list, then each expanded topic as soon as
+    it is parsed (in completion order, tagged with its index), then a summary.
+    Expansions start as their topic is planned; any that finish before the
+    topic list is complete are held back until it has been sent.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+    topics: list[str] = []
+    tasks: list[asyncio.Task] = []
+
+    async def expand(index: int, topic_name: str) -> None:
+        try:
+            topic = await expand_topic(payload, topic_name)
+            events.put_nowait({'type': 'topic', 'index': index, 'data': topic.model_dump()})
+        except Exception as e:
+            events.put_nowait({'type': 'topic_error', 'index': index, 'message': str(e)})
+
+    async def plan() -> None:
+        try:
+            async for topic_name in planned_topics(payload):
+                events.put_nowait({'type': 'topic_planned', 'index': len(topics), 'data': topic_name})
+                with priority(BULK):
+                    tasks.append(asyncio.create_task(expand(len(topics), topic_name)))
+                topics.append(topic_name)
+            events.put_nowait({'type': 'topic_list', 'data': topics})
+        except Exception as e:
+            events.put_nowait({'type': 'error', 'message': str(e)})
+
+    planner = asyncio.create_task(plan())
+    try:
+        planned = False
+        held = []
+        finished = failed = 0
+        while not planned or finished < len(tasks):
+            event = await events.get()
+            if event['type'] == 'error':
+                yield f"data: {json.dumps(event)}\n\n"
+                return
+            if event['type'] in ('topic', 'topic_error'):
+                finished += 1
+                failed += event['type'] == 'topic_error'
+                if not planned:
+                    held.append(event)
+                    continue
+            yield f"data: {json.dumps(event)}\n\n"
+            if event['type'] == 'topic_list':
+                planned = True
+                for event in held:
+                    yield f"data: {json.dumps(event)}\n\n"
+
+        summary = {
+            'type': 'done',
+            'total': len(tasks),
+            'expanded': len(tasks) - failed,
+            'failed': failed,
+        }
+        yield f"data: {json.dumps(summary)}\n\n"
+
+    except Exception as e:
+        yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+    finally:
+        # Client went away or planner failed: stop paying for unfinished expansions.
+        planner.cancel()
+        for task in tasks:
+            task.cancel()
@@ -1,12 +1,12 @@
 from fastapi import FastAPI, HTTPException, Response
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import io
+from typing import Optional
 
 # ---- Your imports ----
-from Chatbot.chatbot import Ai_stream
-from testGenerator.generate_test import generate_test_ai
+from Chatbot.chatbot import Ai_stream, chat_sessions
+from testGenerator.generate_test import generate_test_ai, test_event_stream, question_bank
 from Data_Templates.test_generation_templates import TestGenInput, TestGenOutput
 from Data_Templates.learning_path_templates import (
     LearningPathInput, LearningPathOutPut,
@@ -14,11 +14,24 @@ from Data_Templates.learning_path_templates import (
 )
 from learningpath import (
     create_learning_path, create_topic_list,
-    create_topic_detail, topic_detail_event_stream
+    create_topic_detail, topic_detail_event_stream,
+    learning_path_event_stream, submit_learning_path, learning_path_jobs,
+    topic_prefetch
 )
-from sarvam_api import generate_sarvam_tts
+from sarvam_api import stream_sarvam_tts
 from test_analysis import analyze_test_service, TestAnalysisInput, TestAnalysisOutput
+from class_analysis import analyze_class_service, ClassAnalysisInput, ClassAnalysisOutput
 from learning_path_feedback import generate_quiz_feedback, QuizFeedbackInput, QuizFeedbackOutput
+from Core.response_cache import response_cache
+from Core.audio_cache import audio_cache
+from Core.singleflight import singleflight
+from Core.metrics import registry, MetricsMiddleware
+from Core.model_registry import model_registry
+from Core.hedging import breaker_stats
+from Core.sse import coalesced_events, SSE_HEADERS
+from Core.jobs import JobQueueFull
+from Core.scheduler import scheduler, SchedulerOverloaded, INTERACTIVE
+from Core.content_library import content_library
 
 # ---- App init ----
 app = FastAPI()
@@ -33,8 +46,57 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Session-Id"],
 )
 
+# ---- Metrics ----
+app.add_middleware(MetricsMiddleware)
+
+registry.gauges("llm_cache", "Shared LLM response cache counters", lambda: {
+    k: v for k, v in response_cache.stats().items() if isinstance(v, (int, float))
+}, counters=["memory_hits", "disk_hits", "misses", "coalesced", "saved_seconds"])
+registry.gauges("llm_coalescing", "Single-flight leader/follower counters", singleflight.stats, counters=["leaders", "followers"])
+registry.gauges("model_registry", "Provider clients and HTTP pools created so far", model_registry.stats)
+registry.gauges(
+    "chat_sessions", "Chat sessions held in memory, their size in bytes and summaries", chat_sessions.stats,
+    counters=["evictions", "summaries", "summary_failures", "dropped_turns"],
+)
+registry.gauges(
+    "learning_path_jobs", "Learning path job queue: jobs by state and totals", learning_path_jobs.stats,
+    counters=["submitted", "deduplicated", "rejected", "succeeded", "failed"],
+)
+registry.gauges(
+    "llm_scheduler", "Provider slots in flight, calls queued per priority and rejections", scheduler.stats,
+    counters=["*_admitted", "*_rejected"],
+)
+registry.gauges("llm_circuit", "Provider circuit breaker state (0 closed, 1 half open, 2 open) and trips", breaker_stats, counters=["*_trips"])
+if audio_cache:
+    registry.gauges("tts_cache", "TTS audio chunk cache counters", audio_cache.stats, counters=["hits", "misses"])
+if topic_prefetch:
+    registry.gauges(
+        "topic_prefetch", "Topic detail prefetch: hits, misses, wasted generations", topic_prefetch.stats,
+        counters=["started", "failed", "hits", "hits_in_flight", "misses", "wasted"],
+    )
+if content_library:
+    registry.gauges(
+        "content_library", "Stored topic expansions and lookup outcomes", content_library.stats,
+        counters=["stored", "exact_hits", "fuzzy_hits", "misses"],
+    )
+if question_bank:
+    registry.gauges(
+        "question_bank", "Question bank pool counters", question_bank.stats,
+        counters=["pool_hits", "pool_misses", "refills", "evicted"],
+    )
+
+def http_error(e: Exception) -> HTTPException:
+    if isinstance(e, SchedulerOverloaded):
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(max(1, round(e.retry_after)))})
+    return HTTPException(status_code=500, detail=str(e))
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 # ---- Preflight handler (IMPORTANT) ----
 @app.options("/{full_path:path}")
 async def preflight_handler():
@@ -45,74 +107,167 @@ async def preflight_handler():
 def health():
     return {"status": "ok"}
 
+# ---- Cache Stats ----
+@app.get("/cache/stats")
+def cache_stats():
+    return {**response_cache.stats(), "coalescing": singleflight.stats()}
+
+@app.get("/test/question_bank/stats")
+def question_bank_stats():
+    return question_bank.stats() if question_bank else {"enabled": False}
+
+@app.get("/learning_path/prefetch/stats")
+def topic_prefetch_stats():
+    return topic_prefetch.stats() if topic_prefetch else {"enabled": False}
+
+@app.get("/learning_path/library/stats")
+def content_library_stats():
+    return content_library.stats() if content_library else {"enabled": False}
+
+@app.get("/cache/tts/stats")
+def tts_cache_stats():
+    return audio_cache.stats() if audio_cache else {"enabled": False}
+
 # ---- Chat Streaming ----
 @app.get("/chat/stream")
-def chat_stream(question: str):
-    def event_generator():
-        try:
-            for token in Ai_stream(question):
-                yield f"data: {token}\n\n"
-        except Exception as e:
-            yield f"data: Error: {str(e)}\n\n"
-
+async def chat_stream(question: str, session_id: Optional[str] = None):
+    # Refuse before the stream starts; once headers are sent only an error frame is possible.
+    overloaded = scheduler.overloaded("cerebras", INTERACTIVE)
+    if overloaded:
+        raise http_error(overloaded)
+    # Without session_id each question stands alone; with one, the id to use next turn
+    # (a new one if it was unknown or expired) comes back in X-Session-Id.
+    if session_id is None:
+        return StreamingResponse(
+            coalesced_events(Ai_stream(question)),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS,
+        )
+    session = chat_sessions.get_or_create(session_id)
     return StreamingResponse(
-        event_generator(),
-        media_type="text/event-stream"
+        coalesced_events(Ai_stream(question, session)),
+        media_type="text/event-stream",
+        headers={**SSE_HEADERS, "X-Session-Id": session.id},
     )
 
+@app.get("/llm/scheduler/stats")
+def llm_scheduler_stats():
+    return scheduler.stats()
+
+@app.get("/chat/sessions/stats")
+def chat_session_stats():
+    return chat_sessions.stats()
+
 # ---- Test Generation ----
 @app.post("/test/generate", response_model=TestGenOutput)
-def generate_test(payload: TestGenInput):
+async def generate_test(payload: TestGenInput, user_id: Optional[str] = None):
     try:
-        result = generate_test_ai(payload)
+        result = await generate_test_ai(payload, user_id)
         return result
     except Exception as e:
         print(f"Error in test generation: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
+
+@app.post("/test/generate/stream")
+async def stream_test(payload: TestGenInput, user_id: Optional[str] = None):
+    return StreamingResponse(
+        test_event_stream(payload, user_id),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
 
 # ---- Learning Path ----
 @app.post("/learning_path/generate", response_model=LearningPathOutPut)
-def generate_learning_path(payload: LearningPathInput):
+async def generate_learning_path(payload: LearningPathInput):
     try:
-        return create_learning_path(payload)
+        return await create_learning_path(payload)
     except Exception as e:
         print(f"Error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
+
+@app.post("/learning_path/generate/stream")
+async def stream_learning_path(payload: LearningPathInput):
+    return StreamingResponse(
+        learning_path_event_stream(payload),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+# Same work as /learning_path/generate, without holding the request open for it.
+@app.post("/learning_path/jobs", status_code=202)
+async def submit_learning_path_job(payload: LearningPathInput):
+    try:
+        return submit_learning_path(payload).snapshot()
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+
+@app.get("/learning_path/jobs/stats")
+def learning_path_job_stats():
+    return learning_path_jobs.stats()
+
+@app.get("/learning_path/jobs/{job_id}")
+def get_learning_path_job(job_id: str):
+    job = learning_path_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job.snapshot()
+
+@app.get("/learning_path/jobs/{job_id}/events")
+def learning_path_job_events(job_id: str):
+    job = learning_path_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return StreamingResponse(
+        learning_path_jobs.events(job),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
 
 @app.post("/learning_path/generate/topic_list", response_model=TopicList)
-def generate_topic_list(payload: LearningPathInput):
+async def generate_topic_list(payload: LearningPathInput):
     try:
-        return create_topic_list(payload)
+        return await create_topic_list(payload)
     except Exception as e:
         print(f"Error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @app.post("/learning_path/generate/topic_detail", response_model=Topic)
-def generate_topic_detail(payload: TopicDetail):
+async def generate_topic_detail(payload: TopicDetail):
     try:
-        return create_topic_detail(payload)
+        return await create_topic_detail(payload)
     except Exception as e:
         print(f"Error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 @app.post("/learning_path/generate/topic_detail/stream")
-def stream_topic_detail(payload: TopicDetail):
+async def stream_topic_detail(payload: TopicDetail):
     return StreamingResponse(
         topic_detail_event_stream(payload),
-        media_type="text/event-stream"
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
     )
 
 # ---- TTS ----
 @app.post("/generate_tts/")
-def generate_tts(request: TTSRequest):
+async def generate_tts(request: TTSRequest):
     try:
-        audio_data = generate_sarvam_tts(request.text, request.language)
+        audio_stream = stream_sarvam_tts(request.text, request.language)
 
-        if not audio_data:
+        # Wait for the header so a total failure can still be reported as a 500.
+        header = await anext(audio_stream, None)
+        if header is None:
             return Response(content="Failed to generate audio", status_code=500)
 
+        async def audio_body():
+            try:
+                yield header
+                async for frames in audio_stream:
+                    yield frames
+            finally:
+                await audio_stream.aclose()
+
         return StreamingResponse(
-            io.BytesIO(audio_data),
+            audio_body(),
             media_type="audio/wav"
         )
 
@@ -124,7 +279,7 @@ def generate_tts(request: TTSRequest):
 @app.post("/generate_feedback", response_model=QuizFeedbackOutput)
 async def generate_feedback_route(payload: QuizFeedbackInput):
     try:
-        result = generate_quiz_feedback(payload)
+        result = await generate_quiz_feedback(payload)
 
         if isinstance(result, dict) and result.get("understanding_level") == "Error":
             return result
@@ -133,13 +288,21 @@ async def generate_feedback_route(payload: QuizFeedbackInput):
 
     except Exception as e:
         print(f"Server Error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
 
 # ---- Test Analysis ----
 @app.post("/test/analyze", response_model=TestAnalysisOutput)
-def analyze_test(payload: TestAnalysisInput):
+async def analyze_test(payload: TestAnalysisInput):
     try:
-        return analyze_test_service(payload)
+        return await analyze_test_service(payload)
     except Exception as e:
         print(f"Error analyzing test: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise http_error(e)
+
+@app.post("/test/analyze/batch", response_model=ClassAnalysisOutput)
+async def analyze_class(payload: ClassAnalysisInput):
+    try:
+        return await analyze_class_service(payload)
+    except Exception as e:
+        print(f"Error analyzing class: {str(e)}")
+        raise http_error(e)
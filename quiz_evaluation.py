@@ -0,0 +1,119 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field, model_validator
+from langchain_core.prompts import PromptTemplate
+from Core.response_cache import cached_chain
+from Core.metrics import instrument
+from Core.model_registry import model_registry, QWEN
+from Core.structured_output import structured_chain
+
+# ==========================================
+# 1. DATA MODELS
+# ==========================================
+
+class AttemptAnswer(BaseModel):
+    question: str
+    options: List[str]
+    correct_index: int
+    selected_index: Optional[int] = None  # None if skipped
+
+    @model_validator(mode="after")
+    def _skipped(self) -> "AttemptAnswer":
+        # -1 or any other out-of-range choice is a skip, whichever endpoint sent it.
+        if self.selected_index is not None and not 0 <= self.selected_index < len(self.options):
+            self.selected_index = None
+        return self
+
+class QuizAttempt(BaseModel):
+    """
+    One quiz submission, however the endpoint received it. /generate_feedback
+    and /test/analyze describe the same attempt identically, so they share
+    one evaluation.
+    """
+    topic: str
+    language: str
+    answers: List[AttemptAnswer]
+
+class QuizEvaluation(BaseModel):
+    """Everything /generate_feedback and /test/analyze return, from one generation."""
+    understanding_level: str = Field(description="Overall understanding: Beginner, Intermediate, or Advanced")
+    score_commentary: str = Field(description="A brief, encouraging comment on the score")
+    strengths: List[str] = Field(description="Specific concepts the student understood well")
+    weaknesses: List[str] = Field(description="Specific sub-topics the student struggled with")
+    suggestions: List[str] = Field(description="Actionable study tips to improve")
+    study_plan: List[str] = Field(description="3 actionable steps to improve")
+    feedback: str = Field(description="A short, encouraging summary paragraph")
+
+
+# ==========================================
+# 2. MODEL SETUP
+# ==========================================
+evaluation_model = model_registry.chat_model("cerebras", QWEN)
+PROMPT_VERSION = "v1"
+
+prompt = PromptTemplate(
+    template="""
+You are an expert learning mentor evaluating a student's quiz attempt.
+
+Context:
+- Topic: {topic}
+- Language: {language}
+
+Quiz attempt:
+{attempt}
+
+Task:
+1. Compare the student's answer with the correct answer for each question.
+2. Identify specific patterns in their mistakes (e.g., confused concept A with B) and the concepts they have mastered.
+3. Judge their overall understanding level.
+4. Suggest what to study next based on the errors, and create a specific, actionable 3-step study plan.
+5. Write a brief comment on the score and a short summary paragraph.
+
+Output Rules:
+- Be encouraging but direct about mistakes.
+- Use only the given language.
+
+{format_instructions}
+""",
+    input_variables=["topic", "language", "attempt", "format_instructions"],
+)
+
+# Keyed by a hash of the normalized submission: the second endpoint asking about an attempt is served from cache,
+# and one arriving while the first is still generating shares its result.
+evaluation_chain = cached_chain(
+    instrument(structured_chain(prompt, QuizEvaluation, evaluation_model), "quiz_evaluation"),
+    namespace="quiz_evaluation",
+    model_name=evaluation_model.model_name,
+    prompt_version=PROMPT_VERSION,
+    output_model=QuizEvaluation,
+)
+
+
+# ==========================================
+# 3. SERVICE FUNCTION
+# ==========================================
+
+def format_attempt(attempt: QuizAttempt) -> str:
+    # "Question -> Student answer -> Correct answer -> Result", with the score on top.
+    correct = sum(1 for answer in attempt.answers if answer.selected_index == answer.correct_index)
+    parts = [f"Score: {correct}/{len(attempt.answers)}"]
+    for idx, answer in enumerate(attempt.answers):
+        if answer.selected_index is not None:
+            selected = answer.options[answer.selected_index]
+        else:
+            selected = "No Answer / Skipped"
+        correct_text = answer.options[answer.correct_index] if 0 <= answer.correct_index < len(answer.options) else "Unknown"
+        result = "CORRECT" if answer.selected_index == answer.correct_index else "INCORRECT"
+        parts.append(
+            f"Question {idx + 1}: {answer.question}\n"
+            f"- Student's answer: {selected}\n"
+            f"- Correct answer: {correct_text}\n"
+            f"- Result: {result}"
+        )
+    return "\n\n".join(parts)
+
+async def evaluate_quiz(attempt: QuizAttempt) -> QuizEvaluation:
+    return await evaluation_chain.ainvoke({
+        "topic": attempt.topic,
+        "language": attempt.language,
+        "attempt": format_attempt(attempt),
+    })
@@ -1,42 +1,38 @@
 import os
 import io
+import re
 import wave
 import base64
+import struct
+import asyncio
+import time
 import textwrap
 import json
-from sarvamai import SarvamAI
-from dotenv import load_dotenv
+from Core.audio_cache import audio_cache
+from Core.metrics import record_stage
+from Core.model_registry import model_registry
 
-load_dotenv()
+CHUNK_WIDTH = 450
+TTS_MODEL = "bulbul:v2"
+TTS_SPEAKER = "anushka"
+TTS_LANGUAGE_CODE = "en-IN"
+MAX_CONCURRENT_CHUNKS = int(os.getenv("TTS_MAX_CONCURRENCY", "4"))
 
-client = SarvamAI(
-    api_subscription_key=os.getenv("SARVAM_API_KEY")
-)
+# Sentence ends for English and Devanagari (Hindi/Marathi danda).
+SENTENCE_END = re.compile(r"(?<=[.!?\u0964\u0965])\s+")
 
-def combine_wav_bytes(wav_list):
-    """Safely stitches WAV bytes. Falls back to first chunk if stitching fails."""
-    if not wav_list:
+def combine_audio(segments):
+    """
+    Builds one WAV file from (format, frames) segments.
+    Segments whose format differs from the first are skipped.
+    """
+    if not segments:
         return None
-    if len(wav_list) == 1:
-        return wav_list[0]
 
-    output = io.BytesIO()
-    try:
-        with wave.open(io.BytesIO(wav_list[0]), 'rb') as first_wav:
-            params = first_wav.getparams()
-            with wave.open(output, 'wb') as out_wav:
-                out_wav.setparams(params)
-                out_wav.writeframes(first_wav.readframes(first_wav.getnframes()))
-                for wav_bytes in wav_list[1:]:
-                    try:
-                        with wave.open(io.BytesIO(wav_bytes), 'rb') as next_wav:
-                            if next_wav.getparams()[:3] == params[:3]:
-                                out_wav.writeframes(next_wav.readframes(next_wav.getnframes()))
-                    except:
-                        continue
-        return output.getvalue()
-    except:
-        return wav_list[0]
+    audio_format = segments[0][0]
+    frames = [seg_frames for seg_format, seg_frames in segments if seg_format == audio_format]
+    data_size = sum(len(seg_frames) for seg_frames in frames)
+    return b"".join([wav_header(audio_format, data_size), *frames])
 
 def extract_base64(response):
     """
@@ -58,40 +54,151 @@ def extract_base64(response):
         
     return None
 
-def generate_sarvam_tts(text: str, language: str):
-    clean_text = text.replace("*", "").replace("#", "").strip()
-    chunks = textwrap.wrap(clean_text, width=450, break_long_words=False)
-    
-    print(f"Processing Text: {len(clean_text)} chars -> {len(chunks)} chunks")
-    
-    audio_segments = []
+def split_into_chunks(text: str, width: int = CHUNK_WIDTH):
+    """Packs whole sentences into chunks of at most `width` chars; only overlong sentences are wrapped."""
+    chunks = []
+    current = ""
+    for sentence in SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) > width:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.extend(textwrap.wrap(sentence, width=width, break_long_words=False))
+        elif not current:
+            current = sentence
+        elif len(current) + 1 + len(sentence) <= width:
+            current = f"{current} {sentence}"
+        else:
+            chunks.append(current)
+            current = sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+def read_wav(wav_bytes: bytes):
+    """Returns ((channels, sample width, frame rate), raw frames) of a WAV file."""
+    with wave.open(io.BytesIO(wav_bytes), 'rb') as wav:
+        params = wav.getparams()
+        return params[:3], wav.readframes(wav.getnframes())
 
-    for i, chunk in enumerate(chunks):
-        if not chunk.strip(): continue
-            
+def wav_header(audio_format, data_size=None) -> bytes:
+    """
+    RIFF/WAV header for PCM audio. Without `data_size` the sizes are set to
+    the maximum, which players treat as a stream of unknown length.
+    """
+    nchannels, sampwidth, framerate = audio_format
+    if data_size is None:
+        data_size = 0xFFFFFFFF - 36
+    block_align = nchannels * sampwidth
+    return (
+        b"RIFF" + struct.pack("<I", 36 + data_size) + b"WAVE"
+        + b"fmt " + struct.pack(
+            "<IHHIIHH", 16, 1, nchannels, framerate,
+            framerate * block_align, block_align, sampwidth * 8,
+        )
+        + b"data" + struct.pack("<I", data_size)
+    )
+
+async def fetch_chunk(index: int, total: int, chunk: str, limiter: asyncio.Semaphore):
+    """
+    Returns (format, frames) for one chunk, or None on failure.
+    Cached chunks are served memory-mapped; only misses go to Sarvam.
+    """
+    cache_key = None
+    if audio_cache is not None:
+        started = time.perf_counter()
+        cache_key = audio_cache.key(chunk, TTS_LANGUAGE_CODE, TTS_MODEL, TTS_SPEAKER)
+        # File open and mmap block; keep them off the event loop like the put below.
+        cached = await asyncio.to_thread(audio_cache.get, cache_key)
+        if cached is not None:
+            record_stage("tts", "cache", time.perf_counter() - started)
+            return cached
+
+    async with limiter:
         try:
-            print(f"Fetching chunk {i+1}/{len(chunks)}...")
-            response = client.text_to_speech.convert(
+            started = time.perf_counter()
+            print(f"Fetching chunk {index+1}/{total}...")
+            response = await model_registry.get("sarvam").text_to_speech.convert(
                 text=chunk,
-                target_language_code="en-IN",
-                model="bulbul:v2",
-                speaker="anushka"
+                target_language_code=TTS_LANGUAGE_CODE,
+                model=TTS_MODEL,
+                speaker=TTS_SPEAKER
             )
-            
+
             # Use the fixed extractor that looks for 'audios'
             b64_string = extract_base64(response)
-            
-            if b64_string:
-                chunk_bytes = base64.b64decode(b64_string)
-                audio_segments.append(chunk_bytes)
-            else:
-                print(f"⚠️ Chunk {i+1} extraction failed. Response keys: {dir(response)}")
 
+            if not b64_string:
+                print(f"⚠️ Chunk {index+1} extraction failed. Response keys: {dir(response)}")
+                return None
+
+            audio_format, frames = read_wav(base64.b64decode(b64_string))
+            record_stage("tts", "sarvam", time.perf_counter() - started)
+
+        except Exception as e:
+            print(f"❌ Failed chunk {index+1}: {e}")
+            return None
+
+    if cache_key is not None:
+        try:
+            await asyncio.to_thread(audio_cache.put, cache_key, audio_format, frames)
         except Exception as e:
-            print(f"❌ Failed chunk {i+1}: {e}")
+            # The audio is already synthesized; a failed cache write must not lose it.
+            print(f"⚠️ Could not cache chunk {index+1}: {e}")
+    return audio_format, frames
+
+def start_chunk_fetches(text: str):
+    clean_text = text.replace("*", "").replace("#", "").strip()
+    chunks = split_into_chunks(clean_text)
+
+    print(f"Processing Text: {len(clean_text)} chars -> {len(chunks)} chunks")
+
+    limiter = asyncio.Semaphore(MAX_CONCURRENT_CHUNKS)
+    return [
+        asyncio.create_task(fetch_chunk(i, len(chunks), chunk, limiter))
+        for i, chunk in enumerate(chunks)
+    ]
+
+async def stream_sarvam_tts(text: str, language: str):
+    """
+    Yields a WAV stream: the header and first chunk's frames as soon as that
+    chunk arrives, then the remaining chunks in order while they are fetched
+    concurrently in the background.
+    """
+    tasks = start_chunk_fetches(text)
+    audio_format = None
+    try:
+        for task in tasks:
+            segment = await task
+            if segment is None:
+                continue
+
+            chunk_format, frames = segment
+            if audio_format is None:
+                audio_format = chunk_format
+                yield wav_header(audio_format)
+            elif chunk_format != audio_format:
+                continue
+            yield frames
+
+        if audio_format is None:
+            print("❌ No audio segments were generated.")
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def generate_sarvam_tts(text: str, language: str):
+    audio_segments = [
+        segment
+        for segment in await asyncio.gather(*start_chunk_fetches(text))
+        if segment is not None
+    ]
 
     if not audio_segments:
         print("❌ No audio segments were generated.")
         return None
 
-    return combine_wav_bytes(audio_segments)
\ No newline at end of file
+    return combine_audio(audio_segments)
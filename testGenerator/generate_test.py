@@ -1,14 +1,45 @@
-from langchain_cerebras import ChatCerebras
-from langchain_google_genai import ChatGoogleGenerativeAI
+import os
+import re
+import json
+import time
+import asyncio
+from contextlib import aclosing
 from Data_Templates.test_generation_templates import TestGenInput,Question,TestGenOutput
-from dotenv import load_dotenv
-from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import PromptTemplate
-load_dotenv()
+from pydantic import ValidationError
+from typing import AsyncIterator, Optional
+from Core.response_cache import cached_chain, canonical_key
+from Core.singleflight import singleflight
+from Core.incremental_json import IncrementalJsonParser
+from Core.metrics import instrument, registry
+from Core.model_registry import model_registry, QWEN, GEMINI_FLASH_LITE
+from Core.hedging import hedged
+from Core.scheduler import priority, BULK
+from Core.structured_output import StructuredChain, schema_hint, structured_chain
+from testGenerator.question_bank import QuestionBank, PoolKey, pool_key, fingerprint
 
-LLM = ChatGoogleGenerativeAI(model="gemini-2.5-flash-lite")
-parser = PydanticOutputParser(pydantic_object=TestGenOutput)
+PROMPT_VERSION = "v3"
 
+# Larger tests are generated as concurrent shards of at most this many questions (0 = off).
+TEST_SHARD_SIZE = int(os.getenv("TEST_SHARD_SIZE", "5"))
+# Questions sharing at least this share of their words count as the same question.
+DUPLICATE_SIMILARITY = float(os.getenv("TEST_DUPLICATE_SIMILARITY", "0.8"))
+
+# One per shard, so concurrent shards do not all write the same basic questions.
+SHARD_FOCUS = [
+    "core definitions and terminology",
+    "key facts, examples and characteristics",
+    "processes, causes and effects",
+    "applying the concepts to new situations",
+    "comparisons, differences and common misconceptions",
+    "reasoning with data, diagrams or short scenarios",
+]
+TOP_UP_FOCUS = "less common aspects of the topic"
+
+questions_total = registry.counter(
+    "test_questions_total", "Questions from sharded or streamed test generation by outcome: kept, invalid, duplicate", ["outcome"]
+)
+shard_top_ups_total = registry.counter("test_shard_top_ups_total", "Extra generations for questions sharded test generation was missing")
 
 prompt = PromptTemplate(
     template="""
@@ -19,29 +50,342 @@ Generate a {difficulty} level test.
 Topic: {topic}
 Number of questions: {num_questions}
 Language: {language}
+Focus on: {focus}
 
 Rules:
 - Only MCQ questions
 - Exactly 4 options per question
 - correct_index must match the correct option
 - No explanations
-- Output MUST follow the JSON schema below
 - No extra text, no markdown
 
 {format_instructions}
 """,
-    input_variables=["topic", "difficulty", "num_questions", "language"],
-    partial_variables={
-        "format_instructions": parser.get_format_instructions()
-    },
+    input_variables=["topic", "difficulty", "num_questions", "language", "format_instructions"],
+    partial_variables={"focus": "all parts of the topic"},
 )
-model = ChatCerebras(model="qwen-3-235b-a22b-instruct-2507")
+model = model_registry.chat_model("cerebras", QWEN)
+streaming_model = model_registry.chat_model("cerebras", QWEN, streaming=True)
+gemini = model_registry.chat_model("google", GEMINI_FLASH_LITE, streaming=True)
+
+def is_valid_question(question: Question) -> bool:
+    return (
+        bool(question.question.strip())
+        and len(question.options) == 4
+        and 0 <= question.correct_index < len(question.options)
+    )
+
+def _words(question: Question) -> set:
+    return set(re.findall(r"\w+", question.question.casefold()))
+
+class QuestionSet:
+    """Valid questions in arrival order, skipping near-duplicates of ones already kept."""
+
+    def __init__(self):
+        self.questions: list[Question] = []
+        self._words: list[set] = []
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def add(self, question: Question) -> str:
+        """Keeps `question` if it is valid and new; returns the outcome: kept, invalid or duplicate."""
+        outcome = self._check(question)
+        if outcome == "kept":
+            self.questions.append(question)
+            self._words.append(_words(question))
+        questions_total.inc(outcome)
+        return outcome
+
+    def _check(self, question: Question) -> str:
+        if not is_valid_question(question):
+            return "invalid"
+        words = _words(question)
+        for kept in self._words:
+            if len(words & kept) >= DUPLICATE_SIMILARITY * len(words | kept):
+                return "duplicate"
+        return "kept"
+
+def shard_sizes(total: int, size: int) -> list[int]:
+    """`total` split into the fewest shards of at most `size`, as even as possible."""
+    shards = -(-total // size)
+    base, extra = divmod(total, shards)
+    return [base + (i < extra) for i in range(shards)]
+
+def request_defaults(inputs: dict) -> dict:
+    return {"topic": inputs["topic"], "difficuly": inputs["difficulty"]}
+
+def missing_questions(inputs: dict, test: TestGenOutput) -> Optional[dict]:
+    """Inputs asking only for the questions a truncated or short answer is missing."""
+    missing = inputs["num_questions"] - sum(1 for q in test.questions if is_valid_question(q))
+    return {**inputs, "num_questions": missing} if missing > 0 else None
+
+def merge_questions(test: TestGenOutput, extra: TestGenOutput) -> TestGenOutput:
+    seen = {fingerprint(q) for q in test.questions}
+    questions = list(test.questions)
+    for q in extra.questions:
+        if fingerprint(q) not in seen:
+            seen.add(fingerprint(q))
+            questions.append(q)
+    return test.model_copy(update={"questions": questions})
+
+def build_generation_chain(llm) -> StructuredChain:
+    return structured_chain(
+        prompt, TestGenOutput, llm, defaults=request_defaults, top_up=missing_questions, merge=merge_questions,
+        complete=lambda inputs, test: missing_questions(inputs, test) is None,
+    )
+
+generation_chain = instrument(build_generation_chain(model), "test_generation")
+# Live requests are hedged against Gemini; background refills are not latency sensitive.
+chain = cached_chain(
+    hedged(
+        "test_generation",
+        [
+            ("cerebras", instrument(build_generation_chain(streaming_model), "test_generation")),
+            ("google", instrument(build_generation_chain(gemini), "test_generation")),
+        ],
+        validate=lambda test: any(is_valid_question(q) for q in test.questions),
+    ),
+    namespace="test_generation",
+    model_name=model.model_name,
+    prompt_version=PROMPT_VERSION,
+    output_model=TestGenOutput,
+)
+
+# Parsed incrementally from raw text, so the schema goes into the prompt.
+stream_chain = instrument(
+    prompt.partial(format_instructions=schema_hint(TestGenOutput)) | streaming_model, "test_generation_stream"
+)
+
+async def refill_pool(key: PoolKey, count: int) -> list[Question]:
+    topic, difficulty, language = key
+    # Uncached on purpose: a cached answer would only return questions we already have.
+    with priority(BULK):
+        result = await generation_chain.ainvoke({
+            "topic": topic,
+            "difficulty": difficulty,
+            "num_questions": count,
+            "language": language,
+        })
+    return [q for q in result.questions if is_valid_question(q)]
+
+question_bank = QuestionBank.from_env(refill_pool)
+
+async def generate_sharded(inputs: dict) -> TestGenOutput:
+    """
+    Generates a large test as concurrent smaller ones, each on its own part of
+    the topic, so wall-clock time is that of one shard. Invalid and
+    near-duplicate questions are dropped and only the shortfall is requested
+    again, once.
+    """
+    wanted = inputs["num_questions"]
+    results = await asyncio.gather(
+        *(
+            chain.ainvoke({**inputs, "num_questions": count, "focus": SHARD_FOCUS[i % len(SHARD_FOCUS)]})
+            for i, count in enumerate(shard_sizes(wanted, TEST_SHARD_SIZE))
+        ),
+        return_exceptions=True,
+    )
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if len(errors) == len(results):
+        raise errors[0]
+    if errors:
+        print(f"{len(errors)} of {len(results)} test shards failed: {errors[0]}")
+
+    questions = QuestionSet()
+    for result in results:
+        if not isinstance(result, BaseException):
+            for question in result.questions:
+                questions.add(question)
+
+    missing = wanted - len(questions)
+    if missing > 0:
+        shard_top_ups_total.inc()
+        try:
+            extra = await chain.ainvoke({**inputs, "num_questions": missing, "focus": TOP_UP_FOCUS})
+            for question in extra.questions:
+                questions.add(question)
+        except Exception as e:
+            # A short test beats no test; the shards' questions are still good.
+            print(f"Test generation top-up failed: {e}")
+
+    return TestGenOutput(topic=inputs["topic"], difficuly=inputs["difficulty"], questions=questions.questions[:wanted])
 
-def generate_test_ai(payload: TestGenInput) -> TestGenOutput:
-    chain = prompt | model | parser
-    return chain.invoke({
+async def generate_test_ai(payload: TestGenInput, user_id: Optional[str] = None) -> TestGenOutput:
+    key = pool_key(payload.topic, payload.difficulty, payload.language)
+
+    if question_bank is not None:
+        questions = question_bank.sample(key, payload.num_questions, user_id)
+        question_bank.schedule_refill(key)
+        if questions is not None:
+            return TestGenOutput(topic=payload.topic, difficuly=payload.difficulty, questions=questions)
+
+    inputs = {
         "topic": payload.topic,
         "difficulty": payload.difficulty,
         "num_questions": payload.num_questions,
         "language": payload.language,
-    })
+    }
+    if TEST_SHARD_SIZE and payload.num_questions > TEST_SHARD_SIZE:
+        result = await generate_sharded(inputs)
+    else:
+        result = await chain.ainvoke(inputs)
+
+    if question_bank is not None:
+        question_bank.add(key, [q for q in result.questions if is_valid_question(q)])
+        question_bank.mark_served(key, user_id, result.questions)
+    return result
+
+async def stream_questions(inputs: dict) -> AsyncIterator[dict]:
+    """
+    Raw questions of one generation, each as soon as its JSON object closes.
+    Cached answers are replayed; a complete, fully valid streamed answer is
+    stored in the cache /test/generate reads.
+    """
+    on_disk = chain.cache.disk_path is not None
+    stream_key = canonical_key("test_generation_stream", streaming_model.model_name, PROMPT_VERSION, inputs)
+    if not chain.joins_in_flight(stream_key):
+        cached = await asyncio.to_thread(chain.lookup, inputs) if on_disk else chain.lookup(inputs)
+        if cached is not None:
+            for question in cached.questions:
+                yield question.model_dump()
+            return
+
+    parser = IncrementalJsonParser(emit_items=[("questions", "*")], lenient=True)
+
+    async def token_stream():
+        async for chunk in stream_chain.astream(inputs):
+            yield chunk.content
+
+    started = time.perf_counter()
+    # Identical concurrent requests share one upstream token stream.
+    async for token in singleflight.stream(stream_key, token_stream):
+        for _kind, _path, question in parser.feed(token):
+            yield question
+
+    if parser.done and isinstance(parser.result, dict):
+        try:
+            test = TestGenOutput.model_validate({**request_defaults(inputs), **parser.result})
+        except ValidationError:
+            return
+        if len(test.questions) >= inputs["num_questions"] and all(is_valid_question(q) for q in test.questions):
+            cost = time.perf_counter() - started
+            if on_disk:
+                await asyncio.to_thread(chain.store, inputs, test, cost)
+            else:
+                chain.store(inputs, test, cost)
+
+async def test_event_stream(payload: TestGenInput, user_id: Optional[str] = None):
+    """
+    Progressive variant of generate_test_ai.
+    Sends each question as soon as its JSON object closes and passes
+    validation (tagged with its index in the test), a `question_error` for
+    each invalid or duplicate one, then a summary. Large tests stream their
+    shards concurrently; questions still missing at the end are requested
+    once more.
+    """
+    key = pool_key(payload.topic, payload.difficulty, payload.language)
+    wanted = payload.num_questions
+
+    def question_event(index: int, question: Question) -> str:
+        return f"data: {json.dumps({'type': 'question', 'index': index, 'data': question.model_dump()})}\n\n"
+
+    if question_bank is not None:
+        pooled = question_bank.sample(key, wanted, user_id)
+        question_bank.schedule_refill(key)
+        if pooled is not None:
+            for index, question in enumerate(pooled):
+                yield question_event(index, question)
+            yield f"data: {json.dumps({'type': 'done', 'total': wanted, 'requested': wanted, 'rejected': 0})}\n\n"
+            return
+
+    inputs = {
+        "topic": payload.topic,
+        "difficulty": payload.difficulty,
+        "num_questions": wanted,
+        "language": payload.language,
+    }
+    if TEST_SHARD_SIZE and wanted > TEST_SHARD_SIZE:
+        shards = [
+            {**inputs, "num_questions": count, "focus": SHARD_FOCUS[i % len(SHARD_FOCUS)]}
+            for i, count in enumerate(shard_sizes(wanted, TEST_SHARD_SIZE))
+        ]
+    else:
+        shards = [inputs]
+
+    found: asyncio.Queue = asyncio.Queue()
+    errors: list[Exception] = []
+
+    async def run(shard_inputs: dict) -> None:
+        try:
+            async for raw in stream_questions(shard_inputs):
+                found.put_nowait(raw)
+        except Exception as e:
+            print(f"Test generation stream failed: {e}")
+            errors.append(e)
+        finally:
+            found.put_nowait(None)
+
+    questions = QuestionSet()
+    rejected = 0
+
+    def accept(raw) -> str:
+        nonlocal rejected
+        try:
+            question = Question.model_validate(raw)
+        except ValidationError as e:
+            outcome, message = "invalid", str(e)
+        else:
+            outcome = questions.add(question)
+            if outcome == "kept":
+                return question_event(len(questions) - 1, question)
+            message = "Not 4 options or correct_index out of range" if outcome == "invalid" else "Repeats an earlier question"
+        rejected += 1
+        return f"data: {json.dumps({'type': 'question_error', 'reason': outcome, 'message': message, 'data': raw})}\n\n"
+
+    tasks = [asyncio.create_task(run(shard_inputs)) for shard_inputs in shards]
+    try:
+        # Shards run to the end of their answer (a token or two after the last
+        # question) so complete answers reach the cache.
+        running = len(tasks)
+        while running:
+            raw = await found.get()
+            if raw is None:
+                running -= 1
+            elif len(questions) < wanted:
+                yield accept(raw)
+
+        missing = wanted - len(questions)
+        if missing > 0:
+            shard_top_ups_total.inc()
+            try:
+                async with aclosing(stream_questions({**inputs, "num_questions": missing, "focus": TOP_UP_FOCUS})) as top_up:
+                    async for raw in top_up:
+                        yield accept(raw)
+                        if len(questions) >= wanted:
+                            break
+            except Exception as e:
+                print(f"Test generation top-up failed: {e}")
+                errors.append(e)
+
+        if not questions and errors:
+            yield f"data: {json.dumps({'type': 'error', 'message': str(errors[0])})}\n\n"
+            return
+
+        if question_bank is not None:
+            question_bank.add(key, questions.questions)
+            question_bank.mark_served(key, user_id, questions.questions)
+        summary = {
+            'type': 'done',
+            'total': len(questions),
+            'requested': wanted,
+            'rejected': rejected,
+        }
+        yield f"data: {json.dumps(summary)}\n\n"
+
+    except Exception as e:
+        yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+    finally:
+        # Client went away or the test is complete: stop the remaining shards.
+        for task in tasks:
+            task.cancel()
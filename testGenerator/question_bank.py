@@ -0,0 +1,190 @@
+import os
+import time
+import random
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from Data_Templates.test_generation_templates import Question
+
+PoolKey = Tuple[str, str, str]
+
+
+def pool_key(topic: str, difficulty: str, language: str) -> PoolKey:
+    return (" ".join(topic.split()).casefold(), difficulty, language)
+
+
+def fingerprint(question: Question) -> str:
+    return " ".join(question.question.split()).casefold()
+
+
+class QuestionPool:
+    def __init__(self, max_users: int):
+        self.questions: Dict[str, Question] = {}
+        self.served: "OrderedDict[str, set]" = OrderedDict()
+        self.max_users = max_users
+        self.refilling = False
+        self.used_at = time.monotonic()
+
+    def seen_by(self, user_id: str) -> set:
+        seen = self.served.get(user_id)
+        if seen is None:
+            seen = self.served[user_id] = set()
+            while len(self.served) > self.max_users:
+                self.served.popitem(last=False)
+        self.served.move_to_end(user_id)
+        return seen
+
+
+class QuestionBank:
+    """
+    Pools of validated questions per (topic, difficulty, language).
+    Tests are sampled from a pool without repeating questions a user has
+    already been served; pools running low are topped up in the background.
+
+    A pool is only created once its key has been asked for `min_requests`
+    times (counted in a bounded map) and a refill starts. At most
+    `max_pools` pools are kept; the least recently used, and any unused for
+    `pool_ttl` seconds, are dropped.
+    """
+
+    def __init__(
+        self,
+        refill: Callable[[PoolKey, int], Awaitable[List[Question]]],
+        target_size: int = 60,
+        low_watermark: int = 20,
+        refill_batch: int = 20,
+        min_requests: int = 2,
+        max_users_per_pool: int = 1000,
+        max_pools: int = 1000,
+        pool_ttl: float = 86400,
+    ):
+        self.refill = refill
+        self.target_size = target_size
+        self.low_watermark = low_watermark
+        self.refill_batch = refill_batch
+        self.min_requests = min_requests
+        self.max_users_per_pool = max_users_per_pool
+        self.max_pools = max_pools
+        self.pool_ttl = pool_ttl
+
+        self._pools: "OrderedDict[PoolKey, QuestionPool]" = OrderedDict()
+        # Requests per key that has no pool yet; bounded like the pools themselves.
+        self._demand: "OrderedDict[PoolKey, int]" = OrderedDict()
+        self._tasks: set = set()
+        self.pool_hits = 0
+        self.pool_misses = 0
+        self.refills = 0
+        self.evicted = 0
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        while self._pools:
+            pool = next(iter(self._pools.values()))
+            if len(self._pools) <= self.max_pools and now - pool.used_at <= self.pool_ttl:
+                break
+            self._pools.popitem(last=False)
+            self.evicted += 1
+
+    def _get(self, key: PoolKey) -> Optional[QuestionPool]:
+        self._expire()
+        pool = self._pools.get(key)
+        if pool is not None:
+            pool.used_at = time.monotonic()
+            self._pools.move_to_end(key)
+        return pool
+
+    def _count_request(self, key: PoolKey) -> None:
+        self._demand[key] = self._demand.pop(key, 0) + 1
+        while len(self._demand) > self.max_pools:
+            self._demand.popitem(last=False)
+
+    def add(self, key: PoolKey, questions: List[Question]) -> int:
+        """Adds already validated questions to an existing pool, skipping duplicates. Returns how many were new."""
+        pool = self._get(key)
+        if pool is None:
+            return 0
+        added = 0
+        for question in questions:
+            fp = fingerprint(question)
+            if fp not in pool.questions:
+                pool.questions[fp] = question
+                added += 1
+        return added
+
+    def mark_served(self, key: PoolKey, user_id: Optional[str], questions: List[Question]) -> None:
+        pool = self._get(key)
+        if user_id is not None and pool is not None:
+            pool.seen_by(user_id).update(fingerprint(q) for q in questions)
+
+    def sample(self, key: PoolKey, count: int, user_id: Optional[str] = None) -> Optional[List[Question]]:
+        """Returns `count` questions the user has not seen yet, or None if the pool cannot cover it."""
+        pool = self._get(key)
+        if pool is None:
+            self._count_request(key)
+            self.pool_misses += 1
+            return None
+        seen = pool.seen_by(user_id) if user_id is not None else set()
+        unseen = [fp for fp in pool.questions if fp not in seen]
+        if len(unseen) < count:
+            self.pool_misses += 1
+            return None
+
+        self.pool_hits += 1
+        picked = random.sample(unseen, count)
+        seen.update(picked)
+        return [pool.questions[fp] for fp in picked]
+
+    def schedule_refill(self, key: PoolKey) -> None:
+        pool = self._get(key)
+        if pool is None:
+            # One-off topics are not worth pre-generating for.
+            if self._demand.get(key, 0) < self.min_requests:
+                return
+            del self._demand[key]
+            pool = self._pools[key] = QuestionPool(self.max_users_per_pool)
+            self._expire()
+        if pool.refilling or len(pool.questions) >= self.low_watermark:
+            return
+        pool.refilling = True
+        task = asyncio.create_task(self._refill(key, pool))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refill(self, key: PoolKey, pool: QuestionPool) -> None:
+        try:
+            while len(pool.questions) < self.target_size:
+                questions = await self.refill(key, self.refill_batch)
+                self.refills += 1
+                if not self.add(key, questions):
+                    # The model keeps repeating itself; try again on a later request.
+                    break
+        except Exception as e:
+            print(f"Question bank refill failed for {key}: {e}")
+        finally:
+            pool.refilling = False
+
+    def stats(self) -> dict:
+        return {
+            "pools": len(self._pools),
+            "questions": sum(len(pool.questions) for pool in self._pools.values()),
+            "pool_hits": self.pool_hits,
+            "pool_misses": self.pool_misses,
+            "refills": self.refills,
+            "refills_running": len(self._tasks),
+            "evicted": self.evicted,
+        }
+
+    @classmethod
+    def from_env(cls, refill: Callable[[PoolKey, int], Awaitable[List[Question]]]) -> Optional["QuestionBank"]:
+        if os.getenv("QUESTION_BANK_ENABLED", "1") != "1":
+            return None
+        return cls(
+            refill,
+            target_size=int(os.getenv("QUESTION_BANK_TARGET_SIZE", "60")),
+            low_watermark=int(os.getenv("QUESTION_BANK_LOW_WATERMARK", "20")),
+            refill_batch=int(os.getenv("QUESTION_BANK_REFILL_BATCH", "20")),
+            min_requests=int(os.getenv("QUESTION_BANK_MIN_REQUESTS", "2")),
+            max_pools=int(os.getenv("QUESTION_BANK_MAX_POOLS", "1000")),
+            pool_ttl=float(os.getenv("QUESTION_BANK_POOL_TTL_SECONDS", "86400")),
+        )